@@ -1,17 +1,26 @@
 # 1. IMPORTAÇÕES
-import pandas as pd
 import plotly.express as px
+import plotly.io as pio
 import streamlit as st
 from streamlit_option_menu import option_menu
 
-from filtros import sidebar_filtros
+from dados import (
+    aviso_versao, carregar_aba, descrever_versao, janela_competencias, validar_esquema, versao_dados,
+    versao_fatia
+)
+from periodos import COLUNA_PERIODO_MAP
+from filtros import sidebar_filtros, aplicar_filtros_avancados
 from matriz_desempenho import grafico_fourbox
+from cubo_fourbox import carregar_cubo_fourbox
 from graficos import (
     grafico_nota_producao_series, grafico_custo_realizado_vs_meta, 
     exibir_cards_orcamentarios, grafico_fluxo_caixa, exibir_cards_fluxo_caixa
 )
 from painel_especialidades import exibir_metricas_com_donut
-from radar import grafico_radar_notas, exibir_cards_radar
+from radar import (
+    MODOS_RADAR, RADAR_MOSAICO_MAX, grafico_radar_notas, exibir_cards_radar,
+    grafico_radar_unidades, grafico_radar_mosaico
+)
 import os
 
 PASSWORD = st.secrets.get("APP_PASSWORD")
@@ -36,6 +45,9 @@ if not st.session_state.autenticado:
 # CONSTANTES GLOBAIS
 UNIDADE_PADRAO = "UNIDADE A - Nº 12 - CARIACICA/ES"
 
+# Máximo de figuras da Matriz Desempenho mantidas em cache (as menos usadas saem primeiro)
+FIGURAS_FOURBOX_MAX = 32
+
 # 2. CONFIGURAÇÃO DA PÁGINA
 st.set_page_config(
     layout="wide",
@@ -48,54 +60,6 @@ st.set_page_config(
 with open("estilo.css") as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
-# 3. CACHE E PROCESSAMENTO DE DADOS
-@st.cache_data
-def carregar_e_processar_dados():
-    """Carrega e processa todos os dados de uma só vez"""
-    df = pd.read_parquet("indicadores1.parquet")
-    
-    # Renomeações
-    df.rename(columns={
-        "curs_prese": "curso_prese",
-        "curs_dista": "curso_ead",
-        "pct_curs_prese": "pct_curso_prese",
-        "pct_curs_dista": "pct_curso_ead"
-    }, inplace=True)
-    
-    # Processamento temporal
-    df["competencia"] = df["competencia"].astype(str)
-    df["ano"] = df["competencia"].str[:4]
-    df["mes"] = df["competencia"].str[5:7].astype(int)
-    
-    # Aplicação vetorizada para semestre e trimestre
-    df["semestre"] = (df["mes"] > 6).astype(int) + 1
-    df["trimestre_mes"] = ((df["mes"] - 1) // 3 + 1).astype(str)
-    df["trimestre"] = df["ano"] + "-" + df["trimestre_mes"]
-    df["ano_semestre"] = df["ano"] + "-" + df["semestre"].astype(str)
-    
-    # Conversões numéricas em batch
-    colunas_numericas = [
-        "nota_producao", "nota_custo", "nota_receita",
-        "nota_orcamento", "nota_caixa", "nota_capacidade_produtiva", "idade_unidade"
-    ]
-    for col in colunas_numericas:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-    
-    # Preenchimento de NaN apenas para colunas não categóricas
-    df[df.select_dtypes(exclude="category").columns] = df.select_dtypes(exclude="category").fillna(0)
-    
-    df.sort_values(by="competencia", inplace=True)
-    return df
-
-# Mapeamento de colunas por período (constante)
-COLUNA_PERIODO_MAP = {
-    "Mês": "competencia",
-    "Semestre": "ano_semestre", 
-    "Ano": "ano",
-    "Trimestre": "trimestre"
-}
-
 # Configuração de abas (constante)
 ABAS_CONFIG = {
     "options": ["Matriz Desempenho", "Radar",  "Atendimentos", "Orçamento/Receita", "Custo", "Equilíbrio Financeiro"],
@@ -126,9 +90,23 @@ def aplicar_unidade_padrao(unidade_sel, df):
             return UNIDADE_PADRAO
     return unidade_sel
 
+def janela_da_aba(aba, coluna_periodo, competencia_sel):
+    """
+    Competências lidas pelas abas de série histórica
+
+    No modo janela (PAINEL_JANELA_HISTORICO > 0) lê só o período ativo e o histórico
+    recente; as partições antigas só são carregadas se o usuário pedir o histórico completo.
+    """
+    janela = janela_competencias(coluna_periodo, competencia_sel)
+    if janela is None:
+        return None
+    if st.toggle("Carregar histórico completo", key=f"historico_completo_{aba}"):
+        return None
+    return janela
+
 def main():
-    # Carregamento único dos dados
-    df = carregar_e_processar_dados()
+    # Dimensões para os filtros (cada aba carrega sua própria projeção)
+    df = carregar_aba("Filtros").df
     
     # 4. NAVEGAÇÃO
     aba_selecionada = option_menu(
@@ -140,50 +118,101 @@ def main():
     
     # 5. FILTROS (processamento único)
     filtros = sidebar_filtros(df)
-    (df_filtro, empresa_sel, competencia_sel, agrupamento_opcao, 
+    (empresa_sel, competencia_sel, agrupamento_opcao, 
      conselho_sel, unidade_sel, tipologia_sel, variaveis_x, pesos_x, 
-     variaveis_y, pesos_y, filtro_col, df_empresa, nome_map) = filtros
+     variaveis_y, pesos_y, filtro_col, nome_map) = filtros
     
     coluna_periodo = COLUNA_PERIODO_MAP[agrupamento_opcao]
     
+    # Versão registrada em uso (trocada por versoes.py sem reiniciar a aplicação)
+    versao_registrada = descrever_versao()
+    if versao_registrada:
+        st.sidebar.caption(f"📦 Dados: {versao_registrada}")
+    aviso = aviso_versao()
+    if aviso:
+        st.warning(f"⚠️ Registro de versões: {aviso}")
+    
+    # Valores monetários inválidos no dataset (validados uma vez por versão dos dados)
+    invalidas = validar_esquema(versao_dados())
+    if not invalidas.empty:
+        colunas_invalidas = ", ".join(f"{c} ({n})" for c, n in zip(invalidas["coluna"], invalidas["invalidas"]))
+        st.sidebar.warning(f"⚠️ Valores monetários inválidos tratados como 0: {colunas_invalidas}")
+    
+    # Unidade padrão para as abas fora da Matriz Desempenho
+    unidade_final = aplicar_unidade_padrao(unidade_sel, df)
+    
     # 6. RENDERIZAÇÃO DAS ABAS
     if aba_selecionada == "Matriz Desempenho":
-        renderizar_aba_4box(df_filtro, empresa_sel, competencia_sel, unidade_sel, 
-                           coluna_periodo, variaveis_x, pesos_x, variaveis_y, 
-                           pesos_y, nome_map, filtro_col)
+        renderizar_aba_4box(empresa_sel, competencia_sel, unidade_sel, coluna_periodo,
+                           conselho_sel, tipologia_sel, variaveis_x, pesos_x,
+                           variaveis_y, pesos_y, nome_map, filtro_col)
     
     
     elif aba_selecionada == "Atendimentos":
-        renderizar_aba_atendimentos(df, empresa_sel, unidade_sel, competencia_sel, 
-                                   coluna_periodo)
+        janela = janela_da_aba(aba_selecionada, coluna_periodo, competencia_sel)
+        renderizar_aba_atendimentos(carregar_aba(aba_selecionada, competencias=janela), empresa_sel, unidade_final,
+                                   competencia_sel, coluna_periodo)
     
     elif aba_selecionada == "Custo":
-        renderizar_aba_custo(df, empresa_sel, unidade_sel, competencia_sel)
+        janela = janela_da_aba(aba_selecionada, coluna_periodo, competencia_sel)
+        renderizar_aba_custo(carregar_aba(aba_selecionada, empresa_sel, competencias=janela), empresa_sel,
+                            unidade_final, competencia_sel)
     
     elif aba_selecionada == "Orçamento/Receita":
-        renderizar_aba_orcamento(df, empresa_sel, unidade_sel, competencia_sel, 
-                               coluna_periodo)
+        renderizar_aba_orcamento(
+            carregar_aba(aba_selecionada, empresa_sel, coluna_periodo, competencia_sel),
+            empresa_sel, unidade_final, competencia_sel, coluna_periodo
+        )
     
     elif aba_selecionada == "Radar":
-        renderizar_aba_radar(df, empresa_sel, unidade_sel, competencia_sel, agrupamento_opcao)
+        renderizar_aba_radar(
+            carregar_aba(aba_selecionada, None, coluna_periodo, competencia_sel),
+            empresa_sel, unidade_final, competencia_sel, agrupamento_opcao,
+            df, conselho_sel, tipologia_sel
+        )
     
     elif aba_selecionada == "Equilíbrio Financeiro":
-        renderizar_aba_caixa(df, empresa_sel, unidade_sel, competencia_sel, 
-                            coluna_periodo)
+        janela = janela_da_aba(aba_selecionada, coluna_periodo, competencia_sel)
+        renderizar_aba_caixa(carregar_aba(aba_selecionada, empresa_sel, competencias=janela), empresa_sel,
+                            unidade_final, competencia_sel, coluna_periodo)
+
+@st.cache_data(max_entries=FIGURAS_FOURBOX_MAX, show_spinner=False)
+def figura_fourbox_json(versao, empresa_sel, competencia_sel, unidade_sel, coluna_periodo,
+                        conselho_sel, tipologia_sel, variaveis_x, pesos_x,
+                        variaveis_y, pesos_y, nome_map, filtro_col):
+    """
+    Figura da Matriz Desempenho serializada em JSON
+
+    Memorizada pelo estado dos filtros e pela versão das partições lidas (versao_fatia),
+    de modo que reruns disparados por outros widgets não refazem filtro, eixos, hover e
+    figura, e uma nova competência invalida apenas as figuras que a incluem.
+    """
+    df_filtro = aplicar_filtros_avancados(
+        carregar_aba("Matriz Desempenho", empresa_sel, coluna_periodo, competencia_sel).df,
+        conselho_sel, tipologia_sel, unidade_sel
+    )
+    fig = grafico_fourbox(
+        df_filtro, empresa_sel, competencia_sel, unidade_sel,
+        coluna_periodo, variaveis_x, pesos_x, variaveis_y, pesos_y,
+        nome_map, filtro_col,
+        cubo=carregar_cubo_fourbox(versao_dados())
+    )
+    return fig.to_json()
 
 # Funções de renderização (separadas para melhor organização)
-def renderizar_aba_4box(df_filtro, empresa_sel, competencia_sel, unidade_sel, 
-                       coluna_periodo, variaveis_x, pesos_x, variaveis_y, 
-                       pesos_y, nome_map, filtro_col):
+def renderizar_aba_4box(empresa_sel, competencia_sel, unidade_sel, coluna_periodo,
+                       conselho_sel, tipologia_sel, variaveis_x, pesos_x,
+                       variaveis_y, pesos_y, nome_map, filtro_col):
     
     # Para a Matriz Desempenho (fourbox), usar a unidade selecionada como está
     # NÃO aplicar unidade padrão aqui
     
-    fig = grafico_fourbox(
-        df_filtro, empresa_sel, competencia_sel, unidade_sel,
-        coluna_periodo, variaveis_x, pesos_x, variaveis_y, pesos_y,
+    fig = pio.from_json(figura_fourbox_json(
+        versao_fatia(empresa_sel, coluna_periodo, competencia_sel),
+        empresa_sel, competencia_sel, unidade_sel, coluna_periodo,
+        conselho_sel, tipologia_sel, variaveis_x, pesos_x, variaveis_y, pesos_y,
         nome_map, filtro_col
-    )
+    ))
     
     with st.expander("ℹ️ Ver interpretação estratégica da Matriz Desempenho"):
         st.markdown("""
@@ -245,10 +274,7 @@ def renderizar_aba_4box(df_filtro, empresa_sel, competencia_sel, unidade_sel,
     
     st.plotly_chart(fig, use_container_width=True, config=plotly_config)
 
-def renderizar_aba_atendimentos(df, empresa_sel, unidade_sel, competencia_sel, coluna_periodo):
-    # Aplicar unidade padrão se necessário
-    unidade_final = aplicar_unidade_padrao(unidade_sel, df)
-    
+def renderizar_aba_atendimentos(dados, empresa_sel, unidade_final, competencia_sel, coluna_periodo):
     st.markdown("<div style='margin-top: 30px; <br>'></div>", unsafe_allow_html=True)
     st.subheader("🧾 Produção")
     st.markdown("<div style='margin-top: 30px; <br>'></div>", unsafe_allow_html=True)
@@ -260,16 +286,13 @@ def renderizar_aba_atendimentos(df, empresa_sel, unidade_sel, competencia_sel, c
         > Especialidade -> Executado -> meta.
         """)
     
-    st.plotly_chart(grafico_nota_producao_series(df, empresa_sel, unidade_final), 
+    st.plotly_chart(grafico_nota_producao_series(dados, empresa_sel, unidade_final), 
                    use_container_width=True)
     st.markdown(f"<h4 style='text-align: center;'><b><br>{unidade_final} ({competencia_sel})</br></h4>", 
                unsafe_allow_html=True)
-    exibir_metricas_com_donut(df, unidade_final, coluna_periodo, competencia_sel)
+    exibir_metricas_com_donut(dados, unidade_final, coluna_periodo, competencia_sel)
 
-def renderizar_aba_custo(df, empresa_sel, unidade_sel, competencia_sel):
-    # Aplicar unidade padrão se necessário
-    unidade_final = aplicar_unidade_padrao(unidade_sel, df)
-    
+def renderizar_aba_custo(dados, empresa_sel, unidade_final, competencia_sel):
     st.subheader("💸 Custo Realizado vs Meta por Competência")
     with st.expander("ℹ️ Descrição"):
         st.markdown("""
@@ -285,13 +308,10 @@ def renderizar_aba_custo(df, empresa_sel, unidade_sel, competencia_sel):
         > **Coluna Verde**: Valor executado melhor que a meta.
         """)
     
-    st.plotly_chart(grafico_custo_realizado_vs_meta(df, empresa_sel, unidade_final, competencia_sel), 
+    st.plotly_chart(grafico_custo_realizado_vs_meta(dados, empresa_sel, unidade_final, competencia_sel), 
                    use_container_width=True)
 
-def renderizar_aba_orcamento(df, empresa_sel, unidade_sel, competencia_sel, coluna_periodo):
-    # Aplicar unidade padrão se necessário
-    unidade_final = aplicar_unidade_padrao(unidade_sel, df)
-    
+def renderizar_aba_orcamento(dados, empresa_sel, unidade_final, competencia_sel, coluna_periodo):
     st.markdown("<div style='margin-top: 30px; <br>'></div>", unsafe_allow_html=True)
     st.subheader("📦 Indicadores Orçamentários")
     st.markdown("<div style='margin-top: 30px; <br>'></div>", unsafe_allow_html=True)
@@ -305,36 +325,66 @@ def renderizar_aba_orcamento(df, empresa_sel, unidade_sel, competencia_sel, colu
     
     st.markdown(f"<h4 style='text-align: center;'><b><br>{unidade_final} ({competencia_sel})</br></h4>", 
                unsafe_allow_html=True)
-    exibir_cards_orcamentarios(df, empresa_sel, unidade_final, competencia_sel, coluna_periodo)
+    exibir_cards_orcamentarios(dados, empresa_sel, unidade_final, competencia_sel, coluna_periodo)
 
-def renderizar_aba_radar(df, empresa_sel, unidade_sel, competencia_sel, agrupamento_opcao):
-    # Aplicar unidade padrão se necessário
-    unidade_final = aplicar_unidade_padrao(unidade_sel, df)
-    
+def renderizar_aba_radar(dados, empresa_sel, unidade_final, competencia_sel, agrupamento_opcao,
+                         df_dimensoes, conselho_sel, tipologia_sel):
     st.subheader("📡 Radar de Indicadores")
+    modo = st.radio("Visualização", MODOS_RADAR, horizontal=True, key="modo_radar")
+    
+    if modo != MODOS_RADAR[0]:
+        renderizar_radar_unidades(modo, df_dimensoes, empresa_sel, unidade_final, competencia_sel,
+                                  agrupamento_opcao, conselho_sel, tipologia_sel)
+        return
+    
     st.markdown(f"<h4 style='text-align: center;'><b>{unidade_final} ({competencia_sel})</b></h4><br>", 
                unsafe_allow_html=True)
     
     col_grafico, col_cards = st.columns([2, 1])
     
     with col_grafico:
-        fig_radar = grafico_radar_notas(df, empresa_sel, unidade_final, competencia_sel, agrupamento_opcao)
+        fig_radar = grafico_radar_notas(dados, empresa_sel, unidade_final, competencia_sel, agrupamento_opcao)
         st.plotly_chart(fig_radar, use_container_width=True)
     
     st.markdown("<br><br>", unsafe_allow_html=True)
     with col_cards:
-        exibir_cards_radar(df, empresa_sel, unidade_final, competencia_sel, agrupamento_opcao)
+        exibir_cards_radar(dados, empresa_sel, unidade_final, competencia_sel, agrupamento_opcao)
 
-def renderizar_aba_caixa(df, empresa_sel, unidade_sel, competencia_sel, coluna_periodo):
-    # Aplicar unidade padrão se necessário
-    unidade_final = aplicar_unidade_padrao(unidade_sel, df)
-    
+def renderizar_radar_unidades(modo, df_dimensoes, empresa_sel, unidade_final, competencia_sel,
+                              agrupamento_opcao, conselho_sel, tipologia_sel):
+    """Radar das unidades do conselho/tipologia filtrados com dados no período, lido do cubo em cache"""
+    coluna_periodo = COLUNA_PERIODO_MAP[agrupamento_opcao]
+    df_unidades = aplicar_filtros_avancados(
+        df_dimensoes[(df_dimensoes["empresa"] == empresa_sel)
+                     & (df_dimensoes[coluna_periodo] == competencia_sel)],
+        conselho_sel, tipologia_sel, "Todas"
+    )
+    unidades = sorted(df_unidades["unidade"].astype(str).unique())
+    
+    st.markdown(f"<h4 style='text-align: center;'><b>{empresa_sel} · {len(unidades)} unidades "
+                f"({competencia_sel})</b></h4><br>", unsafe_allow_html=True)
+    if not unidades:
+        st.warning("Nenhuma unidade para os filtros selecionados.")
+        return
+    
+    cubo = carregar_cubo_fourbox(versao_dados())
+    if modo == MODOS_RADAR[1]:
+        fig = grafico_radar_unidades(cubo, empresa_sel, unidades, competencia_sel, agrupamento_opcao,
+                                     unidade_final)
+    else:
+        if len(unidades) > RADAR_MOSAICO_MAX:
+            st.caption(f"Exibindo as primeiras {RADAR_MOSAICO_MAX} de {len(unidades)} unidades; "
+                       "filtre por conselho ou tipologia para ver as demais.")
+        fig = grafico_radar_mosaico(cubo, empresa_sel, unidades, competencia_sel, agrupamento_opcao)
+    st.plotly_chart(fig, use_container_width=True)
+
+def renderizar_aba_caixa(dados, empresa_sel, unidade_final, competencia_sel, coluna_periodo):
     st.markdown("<div style='margin-top: 30px; <br>'></div>", unsafe_allow_html=True)
     st.markdown("## 💰 Fluxo de Caixa <br>", unsafe_allow_html=True)
     st.markdown(f"<h4 style='text-align: center;'><b>{unidade_final} ({competencia_sel})</b></h4><br>", 
                unsafe_allow_html=True)
-    exibir_cards_fluxo_caixa(df, empresa_sel, unidade_final, competencia_sel, coluna_periodo)
-    st.plotly_chart(grafico_fluxo_caixa(df, empresa_sel, unidade_final, competencia_sel, coluna_periodo), 
+    exibir_cards_fluxo_caixa(dados, empresa_sel, unidade_final, competencia_sel, coluna_periodo)
+    st.plotly_chart(grafico_fluxo_caixa(dados, empresa_sel, unidade_final, competencia_sel, coluna_periodo), 
                    use_container_width=True)
 
 if __name__ == "__main__":
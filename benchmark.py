@@ -0,0 +1,323 @@
+"""
+Benchmarks de desempenho do painel (fora do Streamlit, em modo bare).
+
+Uso:
+    python benchmark.py memoria [--repeticoes N]
+    python benchmark.py hover [--repeticoes N]
+    python benchmark.py figura [--repeticoes N]
+    python benchmark.py hash [--repeticoes N]
+    python benchmark.py janela [--repeticoes N]
+    python benchmark.py especialidades [--repeticoes N]
+    python benchmark.py compacto
+    python benchmark.py compartilhado [--repeticoes N]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from dados import (
+    ARMAZENAMENTO_COMPACTO, COLUNAS_POR_ABA, HASH_DADOS, INDICADORES_BASE, carregar_aba,
+    carregar_aba_compartilhada, carregar_aba_versao, janela_competencias, listar_competencias,
+    versao_dados, versao_fatia
+)
+from filtros import SUFIXO_MAP, aplicar_filtros_avancados
+from graficos import grafico_nota_producao_series, processar_dados_custo, exibir_cards_orcamentarios
+from matriz_desempenho import (
+    grafico_fourbox, filtrar_dados_principal, calcular_eixos_vetorizado, preparar_dados_hover,
+    colorir_nota_otimizado, colorir_notas_vetorizado, formatar_duas_casas,
+    calcular_eixos_matriz, montar_matriz_indicadores, montar_matriz_pesos,
+    adicionar_quadrantes, adicionar_bordas, layout_base_fourbox
+)
+from painel_especialidades import agregar_dados_periodo, metricas_unidade, tabela_especialidades
+from radar import COLUNA_PERIODO_RADAR, calcular_radar, grafico_radar_notas
+
+# Cenário padrão do painel (mesmos padrões da sidebar)
+CENARIO = {
+    "empresa": "SEST",
+    "agrupamento": "Ano",
+    "coluna_periodo": "ano",
+    "periodo": "2024",
+    "conselho": "CRES",
+    "unidade": "UNIDADE A - Nº 12 - CARIACICA/ES",
+    "tipologia": "Todas",
+    "colunas_x": ["nota_producao_anual_padronizada", "nota_custo_anual_padronizada",
+                  "nota_receita_operacional_anual_padronizada"],
+    "pesos_x": [1, 1, 1],
+    "colunas_y": ["nota_orcamento_anual_padronizada", "nota_caixa_anual_padronizada"],
+    "pesos_y": [1, 1],
+}
+
+
+# ===== CENÁRIOS =====
+def rerun_pipeline(c=CENARIO):
+    """Executa o processamento de dados de um rerun de cada aba (projeções já em cache)"""
+    coluna, periodo = c["coluna_periodo"], c["periodo"]
+
+    dados_4box = carregar_aba("Matriz Desempenho", c["empresa"], coluna, periodo)
+    df_filtro = aplicar_filtros_avancados(dados_4box.df, c["conselho"], c["tipologia"], "Todas")
+    grafico_fourbox(
+        df_filtro, c["empresa"], periodo, c["unidade"], coluna,
+        c["colunas_x"], c["pesos_x"], c["colunas_y"], c["pesos_y"], {}, coluna
+    )
+
+    dados_atend = carregar_aba("Atendimentos")
+    grafico_nota_producao_series.__wrapped__(dados_atend, c["empresa"], c["unidade"])
+
+    dados_custo = carregar_aba("Custo", c["empresa"])
+    processar_dados_custo.__wrapped__(dados_custo, c["empresa"], c["unidade"])
+
+    dados_orc = carregar_aba("Orçamento/Receita", c["empresa"], coluna, periodo)
+    exibir_cards_orcamentarios(dados_orc, c["empresa"], c["unidade"], periodo, coluna)
+
+    dados_radar = carregar_aba("Radar", None, coluna, periodo)
+    grafico_radar_notas(dados_radar, c["empresa"], c["unidade"], periodo, c["agrupamento"])
+
+
+def rerun_dados(c=CENARIO):
+    """Somente as etapas de filtro/fatia/colunas derivadas de um rerun (sem montar figuras)"""
+    coluna, periodo = c["coluna_periodo"], c["periodo"]
+
+    df_dim = carregar_aba("Filtros").df
+    df_dim[df_dim["empresa"] == c["empresa"]]
+
+    dados_4box = carregar_aba("Matriz Desempenho", c["empresa"], coluna, periodo)
+    df_filtro = aplicar_filtros_avancados(dados_4box.df, c["conselho"], c["tipologia"], "Todas")
+    df_filtro = filtrar_dados_principal(df_filtro, c["empresa"], periodo, coluna)
+    df_filtro = calcular_eixos_vetorizado(df_filtro, c["colunas_x"], c["pesos_x"], c["colunas_y"], c["pesos_y"])
+    df_filtro["destaque"] = df_filtro["unidade"] == c["unidade"]
+    preparar_dados_hover(df_filtro, c["colunas_x"], c["colunas_y"], {})
+
+    dados_custo = carregar_aba("Custo", c["empresa"])
+    processar_dados_custo.__wrapped__(dados_custo, c["empresa"], c["unidade"])
+
+    dados_radar = carregar_aba("Radar", None, coluna, periodo)
+    for empresa in ["SEST", "SENAT"]:
+        dados_radar.fatia(empresa, coluna, periodo, c["unidade"])
+
+
+# ===== MEDIÇÕES =====
+def medir_pico_memoria(funcao, repeticoes=5):
+    """Pico de memória (tracemalloc) e tempo médio de uma função, após um aquecimento"""
+    funcao()
+    picos, tempos = [], []
+    for _ in range(repeticoes):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+        picos.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return max(picos), sum(tempos) / len(tempos)
+
+def medir_tempo(funcao, repeticoes=5):
+    """Melhor tempo (s) entre as repetições"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+def benchmark_memoria(repeticoes):
+    for nome, funcao in [("dados", rerun_dados), ("dados + figuras", rerun_pipeline)]:
+        pico, tempo = medir_pico_memoria(funcao, repeticoes)
+        print(f"Pico de memória por rerun ({nome}): {pico / 1024 ** 2:.2f} MB | tempo médio: {tempo * 1e3:.1f} ms")
+
+def benchmark_hover(repeticoes):
+    rng = np.random.default_rng(42)
+    for linhas in [10_000, 100_000]:
+        notas = pd.Series(rng.uniform(0, 1, linhas))
+        esperado = notas.apply(colorir_nota_otimizado).to_numpy()
+        assert (colorir_notas_vetorizado(notas) == esperado).all(), "saídas divergentes"
+
+        t_apply = medir_tempo(lambda: notas.apply(colorir_nota_otimizado), repeticoes)
+        t_vetor = medir_tempo(lambda: colorir_notas_vetorizado(notas), repeticoes)
+        print(f"{linhas:>7} notas | apply: {t_apply * 1e3:8.1f} ms | vetorizado: {t_vetor * 1e3:7.1f} ms"
+              f" | {t_apply / t_vetor:.1f}x")
+
+def benchmark_figura(repeticoes):
+    c = CENARIO
+    coluna, periodo = c["coluna_periodo"], c["periodo"]
+    layout = layout_base_fourbox()
+    resto = layout.to_plotly_json()
+    del resto["shapes"], resto["annotations"]
+
+    def fundo_por_chamadas():
+        fig = go.Figure()
+        adicionar_quadrantes(fig)
+        adicionar_bordas(fig)
+        fig.update_layout(resto)
+
+    def fundo_em_cache():
+        go.Figure().update_layout(layout)
+
+    t_chamadas = medir_tempo(fundo_por_chamadas, repeticoes)
+    t_cache = medir_tempo(fundo_em_cache, repeticoes)
+    print(f"Fundo da Matriz | add_shape/add_annotation: {t_chamadas * 1e3:6.1f} ms"
+          f" | layout em cache: {t_cache * 1e3:6.1f} ms | {t_chamadas / t_cache:.1f}x")
+
+    dados_4box = carregar_aba("Matriz Desempenho", c["empresa"], coluna, periodo)
+    df_filtro = aplicar_filtros_avancados(dados_4box.df, c["conselho"], c["tipologia"], "Todas")
+    t_fig = medir_tempo(lambda: grafico_fourbox(
+        df_filtro, c["empresa"], periodo, c["unidade"], coluna,
+        c["colunas_x"], c["pesos_x"], c["colunas_y"], c["pesos_y"], {}, coluna
+    ), repeticoes)
+    print(f"grafico_fourbox completo ({len(df_filtro)} linhas): {t_fig * 1e3:.1f} ms")
+
+def benchmark_hash(repeticoes):
+    @st.cache_data
+    def chave_por_dataframe(df):
+        return None
+
+    @st.cache_data(hash_funcs=HASH_DADOS)
+    def chave_por_handle(dados):
+        return None
+
+    for aba in ["Atendimentos", "Custo", "Radar"]:
+        dados = carregar_aba(aba)
+        chave_por_dataframe(dados.df)
+        chave_por_handle(dados)
+        t_df = medir_tempo(lambda: chave_por_dataframe(dados.df), repeticoes)
+        t_handle = medir_tempo(lambda: chave_por_handle(dados), repeticoes)
+        print(f"{aba:<12} ({len(dados.df)} linhas x {dados.df.shape[1]} colunas) | cache hit com DataFrame:"
+              f" {t_df * 1e3:6.2f} ms | com handle: {t_handle * 1e3:5.2f} ms | {t_df / t_handle:.0f}x")
+
+def benchmark_janela(repeticoes, meses=(3, 6, 12)):
+    c = CENARIO
+    coluna, periodo = "competencia", listar_competencias()[-1]
+    for janela in (0,) + tuple(meses):
+        competencias = janela_competencias(coluna, periodo, janela)
+        for aba in ["Atendimentos", "Custo", "Equilíbrio Financeiro"]:
+            empresa = None if aba == "Atendimentos" else c["empresa"]
+            dados = carregar_aba(aba, empresa, competencias=competencias)
+            t_carga = medir_tempo(lambda: carregar_aba_versao.__wrapped__(
+                aba, empresa, None, None, competencias, None
+            ), repeticoes)
+            memoria = dados.df.memory_usage(deep=True).sum()
+            rotulo = "completo" if competencias is None else f"{janela:>2} meses"
+            print(f"{rotulo:<9} | {aba:<21} | {len(dados.df):>5} linhas | {memoria / 1024 ** 2:6.2f} MB"
+                  f" | leitura: {t_carga * 1e3:6.1f} ms")
+
+def benchmark_especialidades(repeticoes):
+    c = CENARIO
+    coluna, periodo = c["coluna_periodo"], c["periodo"]
+    dados = carregar_aba("Atendimentos")
+    unidades = dados.df["unidade"].astype(str).unique()
+
+    def por_laco(unidades):
+        for unidade in unidades:
+            agregar_dados_periodo(dados.fatia(None, coluna, periodo, unidade))
+
+    def por_tabela(unidades):
+        tabela = tabela_especialidades.__wrapped__(dados, coluna)
+        for unidade in unidades:
+            metricas_unidade(tabela, unidade, periodo)
+
+    tabela = tabela_especialidades.__wrapped__(dados, coluna)
+    t_laco = medir_tempo(lambda: por_laco([c["unidade"]]), repeticoes)
+    t_busca = medir_tempo(lambda: metricas_unidade(tabela, c["unidade"], periodo), repeticoes)
+    print(f"Uma unidade | fatia + agregar_dados_periodo: {t_laco * 1e3:6.2f} ms"
+          f" | busca na tabela em cache: {t_busca * 1e3:5.2f} ms")
+
+    t_laco = medir_tempo(lambda: por_laco(unidades), repeticoes)
+    t_tabela = medir_tempo(lambda: por_tabela(unidades), repeticoes)
+    print(f"{len(unidades)} unidades | laço por unidade: {t_laco * 1e3:7.1f} ms"
+          f" | tabela_especialidades + buscas: {t_tabela * 1e3:6.1f} ms | {t_laco / t_tabela:.1f}x")
+
+def benchmark_compacto():
+    """Memória das abas com e sem ARMAZENAMENTO_COMPACTO e divergência das saídas"""
+    def carregar(aba, compacto):
+        return carregar_aba_versao(aba, None, None, None, None, versao_fatia(), compacto)
+
+    total = {False: 0, True: 0}
+    for aba in COLUNAS_POR_ABA:
+        memoria = {c: carregar(aba, c).df.memory_usage(deep=True).sum() for c in total}
+        for c in total:
+            total[c] += memoria[c]
+        print(f"{aba:<21} | original: {memoria[False] / 1024 ** 2:5.2f} MB"
+              f" | compacto: {memoria[True] / 1024 ** 2:5.2f} MB")
+    print(f"{'Total':<21} | original: {total[False] / 1024 ** 2:5.2f} MB"
+          f" | compacto: {total[True] / 1024 ** 2:5.2f} MB | {total[False] / total[True]:.1f}x")
+
+    # Matriz Desempenho: eixos com pesos iguais, X = primeiros indicadores, Y = demais
+    original, compacto = carregar("Matriz Desempenho", False).df, carregar("Matriz Desempenho", True).df
+    pesos = montar_matriz_pesos([1] * 4, [1] * (len(INDICADORES_BASE) - 4))
+    for coluna_periodo, sufixo in SUFIXO_MAP.items():
+        colunas = [f"{base}{sufixo}" for base in INDICADORES_BASE]
+        eixos = [calcular_eixos_matriz(montar_matriz_indicadores(df, colunas), pesos) for df in (original, compacto)]
+        rotulos = [formatar_duas_casas(e.astype(np.float64).ravel()) for e in eixos]
+        quadrantes = [(e >= 0.5) for e in eixos]
+        print(f"Matriz {coluna_periodo:<12} | máx |Δ| eixos: {np.nanmax(np.abs(eixos[0] - eixos[1])):.2e}"
+              f" | rótulos .2f divergentes: {(rotulos[0] != rotulos[1]).sum()}"
+              f" | quadrantes divergentes: {(quadrantes[0] != quadrantes[1]).any(axis=1).sum()}")
+
+    # Radar: todas as empresas e períodos de cada agrupamento
+    original, compacto = carregar("Radar", False), carregar("Radar", True)
+    for agrupamento, coluna_periodo in COLUNA_PERIODO_RADAR.items():
+        maior = 0.0
+        for periodo in original.df[coluna_periodo].astype(str).unique():
+            for a, b in zip(calcular_radar.__wrapped__(original, "Todas", periodo, agrupamento),
+                            calcular_radar.__wrapped__(compacto, "Todas", periodo, agrupamento)):
+                maior = max(maior, float(np.nanmax(np.abs(a.to_numpy(dtype=float) - b.to_numpy(dtype=float)))))
+        print(f"Radar {agrupamento:<9} | máx |Δ| (padronizados e % de execução): {maior:.2e}")
+
+    # Especialidades: realizado/meta exatos e % com a precisão dos decimais de origem
+    original, compacto = carregar("Atendimentos", False), carregar("Atendimentos", True)
+    a = tabela_especialidades.__wrapped__(original, "competencia")
+    b = tabela_especialidades.__wrapped__(compacto, "competencia")
+    iguais = (a[["valor_real", "valor_meta"]] == b[["valor_real", "valor_meta"]]).all().all()
+    colunas_pct = [col for col in original.df.columns if col.startswith("pct_")]
+    decimais = original.df[colunas_pct].to_numpy(dtype=float)
+    arredondados = np.round(compacto.df[colunas_pct].to_numpy(dtype=float), 2)
+    print(f"Especialidades | realizado/meta idênticos: {iguais}"
+          f" | máx |Δ| %: {np.nanmax(np.abs(a['valor_pct'] - b['valor_pct'])):.2e}"
+          f" | pct_* com 2 casas divergentes: {(decimais != arredondados).sum()}")
+
+def benchmark_compartilhado(repeticoes):
+    """Acerto de cache por sessão: st.cache_data (pickle) x arquivo IPC mapeado em st.cache_resource"""
+    def alocado(funcao):
+        tracemalloc.start()
+        funcao()
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return pico
+
+    for aba in COLUNAS_POR_ABA:
+        privado = lambda: carregar_aba_versao(aba, None, None, None, None, versao_fatia(), ARMAZENAMENTO_COMPACTO)
+        compartilhado = lambda: carregar_aba_compartilhada(
+            aba, None, None, None, None, versao_dados(), ARMAZENAMENTO_COMPACTO
+        )
+        privado(), compartilhado()
+        print(f"{aba:<21} | cache_data: {medir_tempo(privado, repeticoes) * 1e3:6.2f} ms,"
+              f" {alocado(privado) / 1024 ** 2:5.2f} MB por acerto"
+              f" | compartilhado: {medir_tempo(compartilhado, repeticoes) * 1e3:5.2f} ms,"
+              f" {alocado(compartilhado) / 1024 ** 2:5.2f} MB por acerto")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do painel")
+    parser.add_argument("cenario", choices=["memoria", "hover", "figura", "hash", "janela", "especialidades", "compacto", "compartilhado"])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.cenario == "memoria":
+        benchmark_memoria(args.repeticoes)
+    elif args.cenario == "hover":
+        benchmark_hover(args.repeticoes)
+    elif args.cenario == "figura":
+        benchmark_figura(args.repeticoes)
+    elif args.cenario == "hash":
+        benchmark_hash(args.repeticoes)
+    elif args.cenario == "janela":
+        benchmark_janela(args.repeticoes)
+    elif args.cenario == "especialidades":
+        benchmark_especialidades(args.repeticoes)
+    elif args.cenario == "compacto":
+        benchmark_compacto()
+    elif args.cenario == "compartilhado":
+        benchmark_compartilhado(args.repeticoes)
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dados import INDICADORES_BASE, carregar_aba
+from filtros import SUFIXO_MAP
+from matriz_desempenho import calcular_eixos_matriz, montar_matriz_pesos
+
+# ===== CONSTANTES =====
+EMPRESAS = ["SEST", "SENAT"]
+
+# Granularidades na ordem do eixo do cubo (colunas de período de SUFIXO_MAP)
+GRANULARIDADES = list(SUFIXO_MAP.keys())
+
+
+# ===== CUBO =====
+class CuboFourbox:
+    """
+    Coordenadas padronizadas da Matriz Desempenho pré-calculadas para todas as granularidades
+
+    valores é um array float32 denso (empresa, granularidade, período, unidade, indicador)
+    com os *_padronizada de cada granularidade; notas nulas ficam NaN (ver
+    calcular_eixos_matriz). Há uma unidade e um indicador extras zerados ao final,
+    usados para unidades/indicadores ausentes, de forma que a leitura de qualquer
+    seleção é um único gather sem máscaras.
+    """
+
+    def __init__(self, df):
+        self.unidades = sorted(df["unidade"].dropna().astype(str).unique())
+        self.indicadores = list(INDICADORES_BASE)
+        self.periodos = {
+            col: sorted(df[col].dropna().astype(str).unique()) for col in GRANULARIDADES
+        }
+        n_periodos = max((len(p) for p in self.periodos.values()), default=0)
+        self.valores = np.zeros(
+            (len(EMPRESAS), len(GRANULARIDADES), n_periodos,
+             len(self.unidades) + 1, len(self.indicadores) + 1),
+            dtype=np.float32
+        )
+
+        for g, coluna_periodo in enumerate(GRANULARIDADES):
+            sufixo = SUFIXO_MAP[coluna_periodo]
+            colunas = [f"{base}{sufixo}" for base in self.indicadores]
+            existentes = [col for col in colunas if col in df.columns]
+            if not existentes:
+                continue
+            # Valores são constantes por (empresa, período, unidade); média cobre duplicatas
+            medias = (
+                df.groupby(["empresa", coluna_periodo, "unidade"], observed=True)[existentes]
+                .mean()
+                .reindex(columns=colunas, fill_value=0)
+            )
+            chaves = medias.index.to_frame(index=False).astype(str)
+            e = self._codigos(chaves["empresa"], EMPRESAS)
+            p = self._codigos(chaves[coluna_periodo], self.periodos[coluna_periodo])
+            u = self._codigos(chaves["unidade"], self.unidades)
+            validos = (e >= 0) & (p >= 0) & (u >= 0)
+            self.valores[e[validos], g, p[validos], u[validos], :-1] = medias.to_numpy(np.float32, na_value=np.nan)[validos]
+
+    @staticmethod
+    def _codigos(valores, rotulos):
+        """Posição de cada valor em rotulos (-1 se ausente)"""
+        valores = pd.Series(valores)
+        if isinstance(valores.dtype, pd.CategoricalDtype):
+            # Recodifica só as categorias e indexa pelos códigos das linhas
+            mapa = pd.Index(rotulos).get_indexer(valores.cat.categories.astype(str))
+            codigos = valores.cat.codes.to_numpy()
+            return np.where(codigos >= 0, np.append(mapa, -1)[codigos], -1).astype(np.int64)
+        return pd.Index(rotulos).get_indexer(valores.astype(str)).astype(np.int64)
+
+    def indices_indicadores(self, colunas, coluna_periodo):
+        """Índice no cubo de cada coluna *_padronizada (indicador extra zerado se desconhecida)"""
+        sufixo = SUFIXO_MAP.get(coluna_periodo, "")
+        posicao = {base: i for i, base in enumerate(self.indicadores)}
+        sem_dado = len(self.indicadores)
+        return np.array([
+            posicao.get(col[:-len(sufixo)] if sufixo and col.endswith(sufixo) else col, sem_dado)
+            for col in colunas
+        ], dtype=np.int64)
+
+    def coordenadas(self, df_filtro, empresa, coluna_periodo, colunas):
+        """
+        Bloco (linhas × indicadores) das linhas de df_filtro, obtido com um único gather
+
+        Args:
+            df_filtro: Linhas da Matriz Desempenho (usa 'unidade' e a coluna de período)
+            empresa: Empresa das linhas
+            coluna_periodo: Granularidade (competencia, trimestre, ano_semestre, ano)
+            colunas: Colunas *_padronizada na ordem desejada
+
+        Returns:
+            np.ndarray: float32, 0 para unidades/indicadores/períodos ausentes e NaN para notas nulas
+        """
+        e = EMPRESAS.index(empresa)
+        g = GRANULARIDADES.index(coluna_periodo)
+        p = self._codigos(df_filtro[coluna_periodo], self.periodos[coluna_periodo])
+        u = self._codigos(df_filtro["unidade"], self.unidades)
+        # Ausentes apontam para a unidade extra (zerada)
+        u = np.where((u < 0) | (p < 0), len(self.unidades), u)
+        p = np.where(p < 0, 0, p)
+        i = self.indices_indicadores(colunas, coluna_periodo)
+        return self.valores[e, g][p[:, None], u[:, None], i[None, :]]
+
+    def matriz_unidades(self, empresa, coluna_periodo, valor_periodo, unidades, colunas):
+        """
+        Bloco (unidades × indicadores) de um período, obtido com um único gather
+
+        Returns:
+            np.ndarray: float32, 0 para unidades/indicadores ausentes ou período desconhecido
+        """
+        e = EMPRESAS.index(empresa)
+        g = GRANULARIDADES.index(coluna_periodo)
+        p = self._codigos([str(valor_periodo)], self.periodos[coluna_periodo])[0]
+        if p < 0:
+            return np.zeros((len(unidades), len(colunas)), dtype=np.float32)
+        u = self._codigos(list(unidades), self.unidades)
+        u = np.where(u < 0, len(self.unidades), u)
+        i = self.indices_indicadores(colunas, coluna_periodo)
+        return self.valores[e, g, p][u[:, None], i[None, :]]
+
+    def eixos(self, df_filtro, empresa, coluna_periodo, colunas_x, pesos_x, colunas_y, pesos_y):
+        """eixo_x/eixo_y (linhas × 2) para qualquer escolha de pesos, sem recalcular o cubo"""
+        matriz = self.coordenadas(df_filtro, empresa, coluna_periodo, colunas_x + colunas_y)
+        return calcular_eixos_matriz(matriz, montar_matriz_pesos(pesos_x, pesos_y))
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def carregar_cubo_fourbox(versao=None):
+    """
+    Monta o cubo uma vez por versão dos dados a partir da projeção completa da Matriz Desempenho
+
+    versao (dados.versao_dados) entra só na chave: uma nova ingestão remonta o cubo
+    e descarta o anterior. A janela de histórico não entra na chave: as leituras do
+    cubo já se restringem ao período ativo, e trocar de período não o remonta.
+    """
+    return CuboFourbox(carregar_aba("Matriz Desempenho").df)
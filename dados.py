@@ -0,0 +1,966 @@
+import copy
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.ipc as ipc
+from pandas.api.types import CategoricalDtype
+import streamlit as st
+
+from periodos import (
+    CHAVE_METADADOS, COLUNAS_PERIODO, VERSAO_PERIODOS, aplicar_chaves_periodo,
+    derivar_chaves_periodo, versao_periodos_do_schema
+)
+
+# ===== CONSTANTES =====
+# Parquet bruto e versão preparada offline (ver preparar_dados.py)
+ARQUIVO_ORIGEM = "indicadores1.parquet"
+ARQUIVO_DADOS = "indicadores1_preparado.parquet"
+
+# Dataset particionado (hive: empresa=/ano=/competencia=) mantido por ingestao.py.
+# Quando existe, tem precedência sobre os arquivos únicos.
+DIRETORIO_PARTICOES = "indicadores_particionado"
+ARQUIVO_MANIFESTO = "_manifesto.json"  # prefixo "_" é ignorado pelo pyarrow.dataset
+COLUNAS_PARTICAO = ["empresa", "ano", "competencia"]
+ARQUIVO_PARTICAO = "parte-0.parquet"
+
+# Registro de versões do dataset (ver versoes.py): arquivos parquet registrados com
+# hash do conteúdo e resumo do esquema. A versão ativa tem precedência sobre as
+# demais fontes e pode ser trocada com a aplicação no ar.
+ARQUIVO_REGISTRO = os.environ.get("PAINEL_REGISTRO_VERSOES", "_versoes_dados.json")
+
+# Renomeações aplicadas após a leitura (origem -> destino)
+RENOMEAR_COLUNAS = {
+    "curs_prese": "curso_prese",
+    "curs_dista": "curso_ead",
+    "pct_curs_prese": "pct_curso_prese",
+    "pct_curs_dista": "pct_curso_ead"
+}
+
+COLUNAS_NUMERICAS = [
+    "nota_producao", "nota_custo", "nota_receita",
+    "nota_orcamento", "nota_caixa", "nota_capacidade_produtiva", "idade_unidade"
+]
+
+# Colunas usadas pelos filtros da sidebar e por todas as abas
+COLUNAS_DIMENSAO = ["empresa", "unidade", "competencia", "conselho", "tipologia"] + COLUNAS_PERIODO
+
+# Dimensões mantidas como Categorical (máscaras comparam códigos inteiros)
+COLUNAS_CATEGORICAS = [
+    "empresa", "unidade", "conselho", "tipologia",
+    "competencia", "ano", "trimestre", "ano_semestre"
+]
+
+SUFIXOS_PERIODO = ["_mensal", "_trimestral", "_semestral", "_anual"]
+
+INDICADORES_BASE = [
+    "nota_orcamento", "nota_caixa", "nota_nps", "nota_receita_operacional",
+    "nota_custo", "nota_producao", "nota_capacidade_produtiva"
+]
+
+COLUNAS_PADRONIZADAS = [
+    f"{base}{suf}_padronizada" for base in INDICADORES_BASE for suf in SUFIXOS_PERIODO
+]
+
+ESPECIALIDADES_COLUNAS = [
+    "odonto", "fisio", "psico", "nutri", "pale_sest", "elc",
+    "curso_prese", "curso_ead", "pale_senat"
+]
+
+COLUNAS_ORCAMENTO = [
+    "receita_prevista", "receita_realizada",
+    "despesa_prevista", "despesa_liquidada",
+    "proposta", "execucao_orcamentaria"
+]
+
+COLUNAS_CUSTO = ["soma_custo_realizado", "soma_meta"]
+
+COLUNAS_CAIXA = ["receitas", "despesas"] + [f"nota_caixa{suf}" for suf in SUFIXOS_PERIODO]
+
+# Valores monetários/de execução: float64 garantido na carga (ver aplicar_esquema)
+COLUNAS_MONETARIAS = COLUNAS_ORCAMENTO + COLUNAS_CUSTO + ["receitas", "despesas"]
+
+# Política de nulos por coluna (ver aplicar_politica_nulos): quantidades, metas e
+# valores monetários ausentes valem 0 (nada registrado); nas demais colunas
+# numéricas (notas, percentuais, idade) o nulo significa "sem avaliação" e é
+# mantido em dtypes anuláveis, sem virar 0
+COLUNAS_NULO_ZERO = (
+    COLUNAS_MONETARIAS + ESPECIALIDADES_COLUNAS + [f"meta_{col}" for col in ESPECIALIDADES_COLUNAS]
+)
+
+# Tipos Arrow -> dtypes anuláveis do pandas (valores + máscara de nulos)
+TIPOS_ANULAVEIS = {
+    pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+    pa.uint8(): pd.UInt8Dtype(), pa.uint16(): pd.UInt16Dtype(),
+    pa.uint32(): pd.UInt32Dtype(), pa.uint64(): pd.UInt64Dtype(),
+    pa.float32(): pd.Float32Dtype(), pa.float64(): pd.Float64Dtype(),
+}
+
+# Texto numérico após a limpeza (só dígitos, ponto decimal e sinal)
+PADRAO_NUMERO = r"^-?(\d+\.?\d*|\.\d+)$"
+
+# Colunas lidas por cada aba (nomes já renomeados)
+COLUNAS_POR_ABA = {
+    "Filtros": COLUNAS_DIMENSAO,
+    "Matriz Desempenho": COLUNAS_DIMENSAO + ["idade_unidade"] + COLUNAS_PADRONIZADAS,
+    "Radar": (
+        COLUNAS_DIMENSAO + COLUNAS_PADRONIZADAS + COLUNAS_CUSTO + COLUNAS_ORCAMENTO
+        + ["receitas", "despesas", "nota_producao", "nota_nps"]
+    ),
+    "Atendimentos": (
+        COLUNAS_DIMENSAO + ["nota_producao"] + ESPECIALIDADES_COLUNAS
+        + [f"meta_{col}" for col in ESPECIALIDADES_COLUNAS]
+        + [f"pct_{col}" for col in ESPECIALIDADES_COLUNAS]
+    ),
+    "Orçamento/Receita": COLUNAS_DIMENSAO + COLUNAS_ORCAMENTO,
+    "Custo": COLUNAS_DIMENSAO + COLUNAS_CUSTO,
+    "Equilíbrio Financeiro": COLUNAS_DIMENSAO + COLUNAS_CAIXA,
+}
+
+
+# Janela de histórico (em competências) lida pelas abas de série histórica:
+# o período ativo mais as competências anteriores até completar a janela.
+# 0 = histórico completo. Configurável pela variável PAINEL_JANELA_HISTORICO.
+JANELA_HISTORICO = int(os.environ.get("PAINEL_JANELA_HISTORICO", "0"))
+
+# Armazenamento compacto (ver compactar_tabela): notas e percentuais em float32 e
+# contagens no menor tipo inteiro que as comporta; valores monetários seguem em
+# float64. Desligado com PAINEL_ARMAZENAMENTO_COMPACTO=0 (precisão conferida por
+# "python benchmark.py compacto").
+ARMAZENAMENTO_COMPACTO = os.environ.get("PAINEL_ARMAZENAMENTO_COMPACTO", "1") != "0"
+
+# Dataset compartilhado (ver dataset_compartilhado): a tabela processada é gravada uma
+# vez por versão como arquivo Arrow IPC e mapeada em memória (somente leitura); as
+# projeções das abas ficam em st.cache_resource, sem serialização por sessão, e
+# referenciam as mesmas páginas em todas as sessões e processos do servidor.
+# Ligado com PAINEL_DADOS_COMPARTILHADOS=1.
+DADOS_COMPARTILHADOS = os.environ.get("PAINEL_DADOS_COMPARTILHADOS", "0") == "1"
+DIRETORIO_COMPARTILHADO = os.environ.get("PAINEL_DIRETORIO_COMPARTILHADO", ".dados_compartilhados")
+# Projeções mantidas em st.cache_resource (LRU): as de versões anteriores e de
+# períodos/janelas pouco usados saem à medida que novas entram.
+MAX_PROJECOES_COMPARTILHADAS = int(os.environ.get("PAINEL_MAX_PROJECOES_COMPARTILHADAS", "32"))
+
+# Maior precisão decimal (em dígitos) representada sem perda em float32
+DIGITOS_FLOAT32 = 7
+
+# Tipos inteiros candidatos da compactação, do menor para o maior
+INTEIROS_COMPACTOS = {
+    False: [pa.uint8(), pa.uint16(), pa.uint32(), pa.uint64()],
+    True: [pa.int8(), pa.int16(), pa.int32(), pa.int64()],
+}
+
+# Colunas somadas por (empresa, unidade, competencia) no carregamento de cada aba
+COLUNAS_AGREGADAS = {
+    "Custo": COLUNAS_CUSTO,
+    "Equilíbrio Financeiro": ["receitas", "despesas"],
+}
+
+# Chave da linha de totais da empresa nos agregados
+UNIDADE_TODAS = "Todas"
+
+# Colunas de período com posições pré-indexadas
+COLUNAS_PERIODO_INDICE = ["competencia", "ano", "trimestre", "ano_semestre"]
+
+POSICOES_VAZIAS = np.empty(0, dtype=np.int32)
+
+# Copy-on-Write: projeções e fatias são compartilhadas e só copiadas na escrita
+# (padrão a partir do pandas 3, onde a opção não existe mais)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+# ===== ÍNDICE DE LINHAS =====
+class IndiceDados:
+    """
+    DataFrame de uma aba acompanhado de um índice de posições de linha
+
+    As posições são agrupadas uma única vez por empresa, por unidade e por
+    (empresa, coluna_periodo, valor); empresa=None indexa o período com as
+    duas empresas. Os renderizadores obtêm suas fatias por consulta ao
+    dicionário, sem varrer o DataFrame com máscaras booleanas.
+
+    chave identifica o conteúdo (versão de carga + impressão digital calculada
+    uma única vez) e é o que as funções com @st.cache_data(hash_funcs=HASH_DADOS)
+    usam como chave de cache, em vez de hashear o DataFrame a cada chamada.
+    """
+
+    def __init__(self, df, versao=None, colunas_agregadas=None):
+        self.df = df
+        self.chave = (versao, impressao_digital(df))
+        self.agregado = AgregadoCompetencia(df, colunas_agregadas) if colunas_agregadas else None
+        self._por_empresa = self._agrupar(["empresa"])
+        self._por_unidade = self._agrupar(["unidade"])
+        self._por_periodo = {}
+        for col in COLUNAS_PERIODO_INDICE:
+            if col not in df.columns:
+                continue
+            for (valor,), pos in self._agrupar([col]).items():
+                self._por_periodo[(None, col, valor)] = pos
+            for (empresa, valor), pos in self._agrupar(["empresa", col]).items():
+                self._por_periodo[(empresa, col, valor)] = pos
+
+    def _agrupar(self, colunas):
+        """Posições (int32, ordenadas) de cada combinação de valores das colunas"""
+        if not all(col in self.df.columns for col in colunas):
+            return {}
+        grupos = self.df.groupby(colunas, observed=True, sort=False).indices
+        return {
+            tuple(str(v) for v in (chave if isinstance(chave, tuple) else (chave,))): pos.astype(np.int32)
+            for chave, pos in grupos.items()
+        }
+
+    def posicoes(self, empresa=None, coluna_periodo=None, valor_periodo=None, unidade=None):
+        """Posições das linhas que atendem aos filtros (None = sem filtro); None se nenhum filtro"""
+        conjuntos = []
+        if coluna_periodo is not None:
+            chave = (empresa, coluna_periodo, str(valor_periodo))
+            conjuntos.append(self._por_periodo.get(chave, POSICOES_VAZIAS))
+        elif empresa is not None:
+            conjuntos.append(self._por_empresa.get((empresa,), POSICOES_VAZIAS))
+        if unidade is not None:
+            conjuntos.append(self._por_unidade.get((unidade,), POSICOES_VAZIAS))
+
+        if not conjuntos:
+            return None
+        posicoes = conjuntos[0]
+        for outro in conjuntos[1:]:
+            posicoes = np.intersect1d(posicoes, outro, assume_unique=True)
+        return posicoes
+
+    def fatia(self, empresa=None, coluna_periodo=None, valor_periodo=None, unidade=None):
+        """
+        Retorna as linhas da empresa/período/unidade informados
+
+        Args:
+            empresa: Empresa ('SEST'/'SENAT') ou None para ambas
+            coluna_periodo: Coluna de período (competencia, ano, trimestre, ano_semestre) ou None
+            valor_periodo: Valor do período em coluna_periodo
+            unidade: Unidade ou None para todas (o tratamento de "Todas" fica com o chamador)
+
+        Returns:
+            DataFrame: Linhas na mesma ordem do DataFrame original
+        """
+        posicoes = self.posicoes(empresa, coluna_periodo, valor_periodo, unidade)
+        if posicoes is None:
+            # Objeto novo sobre os mesmos dados: colunas criadas pelo chamador não
+            # alteram a projeção em cache (compartilhada no modo DADOS_COMPARTILHADOS)
+            return self.df.copy(deep=False)
+        # Posições contíguas (ex.: um período das duas empresas) viram fatia sem cópia
+        if len(posicoes) and posicoes[-1] - posicoes[0] + 1 == len(posicoes):
+            return self.df.iloc[posicoes[0]:posicoes[-1] + 1]
+        return self.df.iloc[posicoes]
+
+
+# ===== AGREGADOS POR COMPETÊNCIA =====
+class AgregadoCompetencia:
+    """
+    Somas de colunas por (empresa, unidade, competencia), montadas uma vez no carregamento
+
+    Guarda também o total de cada empresa (unidade "Todas"). Todas as séries já vêm
+    alinhadas às competências do DataFrame de origem, zeradas onde não há dado, de
+    modo que os gráficos de custo e fluxo de caixa só leem uma fatia.
+    """
+
+    def __init__(self, df, colunas):
+        self.colunas = [col for col in colunas if col in df.columns]
+        self.competencias = sorted(str(c) for c in df["competencia"].unique())
+        empresas = sorted(str(e) for e in df["empresa"].unique())
+        unidades = sorted(str(u) for u in df["unidade"].unique()) + [UNIDADE_TODAS]
+        self._empresas = {e: i for i, e in enumerate(empresas)}
+        self._unidades = {u: i for i, u in enumerate(unidades)}
+        self._competencias = pd.Index(self.competencias)
+        self._valores = np.zeros(
+            (len(empresas), len(unidades), len(self.competencias), len(self.colunas))
+        )
+
+        por_unidade = df.groupby(["empresa", "unidade", "competencia"], observed=True)[self.colunas].sum()
+        totais = df.groupby(["empresa", "competencia"], observed=True)[self.colunas].sum()
+        self._preencher(por_unidade, por_unidade.index.get_level_values("unidade"))
+        self._preencher(totais, [UNIDADE_TODAS] * len(totais))
+
+    def _preencher(self, somas, unidades):
+        e = [self._empresas[str(v)] for v in somas.index.get_level_values("empresa")]
+        u = [self._unidades[str(v)] for v in unidades]
+        c = self._competencias.get_indexer(somas.index.get_level_values("competencia").astype(str))
+        self._valores[e, u, c] = somas.to_numpy(dtype=float)
+
+    def serie(self, empresa, unidade=None):
+        """
+        Série por competência de uma empresa/unidade
+
+        Args:
+            empresa: Empresa
+            unidade: Unidade ou None/"Todas" para o total da empresa
+
+        Returns:
+            DataFrame: 'competencia' + colunas somadas, uma linha por competência
+        """
+        e = self._empresas.get(empresa)
+        u = self._unidades.get(unidade if unidade and unidade != UNIDADE_TODAS else UNIDADE_TODAS)
+        if e is None or u is None:
+            valores = np.zeros((len(self.competencias), len(self.colunas)))
+        else:
+            valores = self._valores[e, u]
+        serie = pd.DataFrame(valores, columns=self.colunas)
+        serie.insert(0, "competencia", self.competencias)
+        return serie
+
+
+# Funções com @st.cache_data que recebem IndiceDados hasheiam apenas a chave
+HASH_DADOS = {IndiceDados: lambda dados: dados.chave}
+
+
+# ===== FUNÇÕES UTILITÁRIAS =====
+def impressao_digital(df):
+    """Hash do conteúdo (colunas, tipos e valores) de um DataFrame, calculado em uma passada"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(col, str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def caminho_manifesto(diretorio=DIRETORIO_PARTICOES):
+    return os.path.join(diretorio, ARQUIVO_MANIFESTO)
+
+def dataset_particionado():
+    """Indica se o dataset particionado (com manifesto) está disponível e em uso"""
+    return versao_registrada() is None and os.path.exists(caminho_manifesto())
+
+def ler_manifesto(diretorio=DIRETORIO_PARTICOES):
+    """Manifesto do dataset particionado (versão, versão das chaves de período e partições)"""
+    with open(caminho_manifesto(diretorio), encoding="utf-8") as f:
+        return json.load(f)
+
+def hash_arquivo(caminho):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+def arquivo_dados(nome=None):
+    """
+    Fonte em uso: a versão ativa do registro, o dataset particionado, o parquet
+    preparado ou, em último caso, o bruto
+
+    nome escolhe uma versão registrada específica (ex.: para pré-carregá-la).
+    """
+    entrada = versao_registrada(nome)
+    if entrada is not None:
+        return entrada["arquivo"]
+    if dataset_particionado():
+        return DIRETORIO_PARTICOES
+    return ARQUIVO_DADOS if os.path.exists(ARQUIVO_DADOS) else ARQUIVO_ORIGEM
+
+def versao_dados(nome=None):
+    """
+    Identificador da fonte em uso; muda quando o arquivo é regravado ou há nova ingestão
+
+    Versões registradas são identificadas pelo nome e pelo hash do conteúdo; se o
+    arquivo mudou depois do registro, o tamanho e a data entram na chave.
+    """
+    entrada = versao_registrada(nome)
+    if entrada is not None:
+        info = os.stat(entrada["arquivo"])
+        if (info.st_size, info.st_mtime_ns) == (entrada["tamanho"], entrada["mtime_ns"]):
+            return f"{entrada['nome']}:{entrada['hash']}"
+        return f"{entrada['nome']}:{entrada['hash']}:{info.st_size}:{info.st_mtime_ns}"
+    if dataset_particionado():
+        return f"{DIRETORIO_PARTICOES}:{ler_manifesto()['versao']}"
+    arquivo = arquivo_dados()
+    info = os.stat(arquivo)
+    return f"{arquivo}:{info.st_size}:{info.st_mtime_ns}"
+
+def versao_fatia(empresa=None, coluna_periodo=None, valor_periodo=None, competencias=None):
+    """
+    Versão apenas das partições lidas por uma fatia (empresa/período/janela de competências)
+
+    No dataset particionado, uma nova competência altera somente as fatias que a
+    incluem; as demais mantêm a versão e seus caches continuam válidos. Com
+    arquivo único, equivale a versao_dados().
+    """
+    if not dataset_particionado():
+        return versao_dados()
+    if competencias is not None:
+        competencias = set(competencias)
+    if coluna_periodo is not None and valor_periodo is not None:
+        do_periodo = set(competencias_do_periodo(coluna_periodo, valor_periodo))
+        competencias = do_periodo if competencias is None else competencias & do_periodo
+    selecionadas = sorted(
+        (caminho, info["hash"]) for caminho, info in ler_manifesto()["particoes"].items()
+        if (empresa is None or info["empresa"] == empresa)
+        and (competencias is None or info["competencia"] in competencias)
+    )
+    return hashlib.blake2b(repr(selecionadas).encode(), digest_size=16).hexdigest()
+
+def abrir_particoes(diretorio=DIRETORIO_PARTICOES):
+    """
+    Abre um dataset particionado (hive), com as chaves de partição como texto
+
+    Lê apenas os arquivos listados no manifesto: partições em gravação ou deixadas
+    por uma ingestão interrompida só passam a valer quando o manifesto as registra.
+    """
+    particoes = ds.partitioning(
+        pa.schema([(col, pa.string()) for col in COLUNAS_PARTICAO]), flavor="hive"
+    )
+    arquivos = [
+        os.path.join(diretorio, relativo, ARQUIVO_PARTICAO)
+        for relativo in sorted(ler_manifesto(diretorio)["particoes"])
+    ]
+    return ds.dataset(arquivos, format="parquet", partitioning=particoes, partition_base_dir=diretorio)
+
+def abrir_dataset(nome=None):
+    """Abre a fonte em uso (ou a versão registrada nome) como dataset pyarrow, sem ler dados"""
+    if nome is None and dataset_particionado():
+        return abrir_particoes()
+    return ds.dataset(arquivo_dados(nome), format="parquet")
+
+def dataset_preparado(dataset):
+    """Indica se o dataset já traz as chaves de período na versão atual"""
+    return versao_periodos_do_schema(dataset.schema) == VERSAO_PERIODOS
+
+def colunas_origem(colunas, dataset):
+    """Traduz nomes renomeados para os nomes do arquivo, ignorando colunas ausentes"""
+    nomes_disponiveis = set(dataset.schema.names)
+    origem_por_destino = {destino: origem for origem, destino in RENOMEAR_COLUNAS.items()}
+    preparado = dataset_preparado(dataset)
+    colunas_arquivo = []
+    for col in dict.fromkeys(colunas):
+        # No parquet bruto as chaves de período são derivadas após a leitura
+        if col in COLUNAS_PERIODO and not preparado:
+            continue
+        col_arquivo = col if col in nomes_disponiveis else origem_por_destino.get(col, col)
+        if col_arquivo in nomes_disponiveis:
+            colunas_arquivo.append(col_arquivo)
+    return colunas_arquivo
+
+def converter_categoricas(df):
+    """Converte as dimensões para Categorical com categorias ordenadas (no-op se já forem)"""
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns and not isinstance(df[col].dtype, CategoricalDtype):
+            df[col] = df[col].astype(str).astype("category")
+    return df
+
+def relatorio_memoria(df):
+    """
+    Relatório de memória por coluna
+
+    Returns:
+        DataFrame: Colunas 'coluna', 'dtype' e 'MB', ordenado do maior para o menor
+    """
+    uso = df.memory_usage(deep=True, index=False)
+    relatorio = pd.DataFrame({
+        "coluna": uso.index,
+        "dtype": [str(df[col].dtype) for col in uso.index],
+        "MB": uso.to_numpy() / 1024 ** 2
+    })
+    return relatorio.sort_values("MB", ascending=False, ignore_index=True)
+
+def listar_competencias():
+    """Lista as competências disponíveis (pelo manifesto, quando particionado)"""
+    if dataset_particionado():
+        return sorted({info["competencia"] for info in ler_manifesto()["particoes"].values()})
+    return listar_competencias_arquivo(versao_dados())
+
+@st.cache_data(show_spinner=False)
+def listar_competencias_arquivo(versao):
+    """Lê apenas a coluna 'competencia' do arquivo (versao entra só na chave do cache)"""
+    tabela = abrir_dataset().to_table(columns=["competencia"])
+    return sorted(str(c) for c in tabela.column("competencia").unique().to_pylist())
+
+def competencias_do_periodo(coluna_periodo, valor_periodo):
+    """Retorna as competências ('AAAA-MM') que pertencem ao período selecionado"""
+    competencias = pd.Series(listar_competencias())
+    if coluna_periodo == "competencia":
+        return competencias[competencias == str(valor_periodo)].tolist()
+    chaves = derivar_chaves_periodo(competencias)
+    return competencias[(chaves[coluna_periodo] == str(valor_periodo)).to_numpy()].tolist()
+
+def janela_competencias(coluna_periodo, valor_periodo, janela=JANELA_HISTORICO):
+    """
+    Competências da janela de histórico que termina no período ativo
+
+    Cobre sempre o período ativo inteiro, completado com as competências anteriores
+    até somar `janela`. Retorna None (histórico completo) com janela 0 ou período
+    desconhecido.
+    """
+    if not janela or coluna_periodo is None:
+        return None
+    do_periodo = competencias_do_periodo(coluna_periodo, valor_periodo)
+    if not do_periodo:
+        return None
+    todas = listar_competencias()
+    fim = todas.index(max(do_periodo))
+    inicio = min(todas.index(min(do_periodo)), max(0, fim - janela + 1))
+    return tuple(todas[inicio:fim + 1])
+
+def montar_filtro(dataset, empresa=None, coluna_periodo=None, valor_periodo=None, competencias=None):
+    """Monta a expressão de filtro pyarrow para empresa, período e janela de competências"""
+    filtro = None
+    if empresa is not None:
+        filtro = ds.field("empresa") == empresa
+    if competencias is not None:
+        filtro_janela = ds.field("competencia").isin(list(competencias))
+        filtro = filtro_janela if filtro is None else filtro & filtro_janela
+    if coluna_periodo is not None and valor_periodo is not None:
+        # Particionado: filtra pela competência para descartar partições inteiras
+        if dataset_preparado(dataset) and not dataset_particionado():
+            filtro_periodo = ds.field(coluna_periodo) == str(valor_periodo)
+        else:
+            filtro_periodo = ds.field("competencia").isin(
+                competencias_do_periodo(coluna_periodo, valor_periodo)
+            )
+        filtro = filtro_periodo if filtro is None else filtro & filtro_periodo
+    return filtro
+
+
+# ===== VERSÕES DO DATASET =====
+def registro_vazio():
+    return {"ativa": None, "versoes": {}}
+
+@lru_cache(maxsize=4)
+def ler_registro_gravado(caminho, tamanho, mtime_ns):
+    """Lê o JSON do registro; o tamanho e a data na chave invalidam o cache a cada gravação"""
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+def ler_registro(caminho=None):
+    """
+    Registro de versões (vazio se o arquivo não existe)
+
+    Lido do disco só quando o arquivo muda: o dicionário é compartilhado entre as
+    chamadas e não deve ser alterado (gravar_registro recebe uma cópia).
+    """
+    caminho = caminho or ARQUIVO_REGISTRO
+    try:
+        info = os.stat(caminho)
+    except FileNotFoundError:
+        return registro_vazio()
+    return ler_registro_gravado(os.path.abspath(caminho), info.st_size, info.st_mtime_ns)
+
+def gravar_registro(registro, caminho=None):
+    """Grava o registro de forma atômica: as sessões em execução leem a troca no próximo rerun"""
+    caminho = caminho or ARQUIVO_REGISTRO
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(registro, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temporario, caminho)
+
+def problema_versao_ativa(registro=None):
+    """Motivo pelo qual a versão ativa não pode ser usada (None se está válida ou não há ativa)"""
+    registro = registro or ler_registro()
+    nome = registro["ativa"]
+    if nome is None:
+        return None
+    if nome not in registro["versoes"]:
+        return f"versão ativa '{nome}' não está no registro"
+    if not os.path.exists(registro["versoes"][nome]["arquivo"]):
+        return f"arquivo da versão ativa '{nome}' não encontrado: {registro['versoes'][nome]['arquivo']}"
+    return None
+
+def versao_registrada(nome=None):
+    """
+    Entrada do registro da versão nome (ou da ativa)
+
+    Uma versão ativa ausente do registro ou com o arquivo removido é ignorada: a
+    aplicação volta às fontes padrão e aviso_versao explica o motivo.
+
+    Returns:
+        dict | None: None sem registro/versão ativa válida; ValueError se nome não está registrado
+    """
+    registro = ler_registro()
+    if nome is None:
+        if registro["ativa"] is None or problema_versao_ativa(registro):
+            return None
+        nome = registro["ativa"]
+    if nome not in registro["versoes"]:
+        raise ValueError(f"Versão não registrada: {nome}")
+    return registro["versoes"][nome]
+
+def aviso_versao():
+    """Aviso para a interface quando a versão ativa foi ignorada (None se não há problema)"""
+    problema = problema_versao_ativa()
+    return None if problema is None else f"{problema}; usando as fontes padrão."
+
+def descrever_versao():
+    """Rótulo da versão registrada ativa (None quando o registro não está em uso)"""
+    entrada = versao_registrada()
+    return None if entrada is None else f"{entrada['nome']} ({entrada['hash'][:8]})"
+
+def colunas_ausentes(nomes):
+    """
+    Colunas de cada aba que faltam em um esquema (nomes de origem)
+
+    As chaves de período derivadas de 'competencia' não contam como ausentes.
+
+    Returns:
+        dict: aba -> lista de colunas ausentes (apenas abas incompletas)
+    """
+    disponiveis = {RENOMEAR_COLUNAS.get(col, col) for col in nomes}
+    if "competencia" in disponiveis:
+        disponiveis |= set(COLUNAS_PERIODO)
+    ausentes = {
+        aba: [col for col in colunas if col not in disponiveis]
+        for aba, colunas in COLUNAS_POR_ABA.items()
+    }
+    return {aba: cols for aba, cols in ausentes.items() if cols}
+
+def resumir_esquema(arquivo):
+    """Linhas, tipos por coluna, competências e abas incompletas de um parquet"""
+    dataset = ds.dataset(arquivo, format="parquet")
+    competencias = pc.unique(pc.cast(dataset.to_table(columns=["competencia"]).column("competencia"), pa.string()))
+    competencias = sorted(c for c in competencias.to_pylist() if c is not None)
+    return {
+        "linhas": dataset.count_rows(),
+        "tipos": {campo.name: str(campo.type) for campo in dataset.schema},
+        "competencias": [competencias[0], competencias[-1]] if competencias else [],
+        "preparado": dataset_preparado(dataset),
+        "abas_incompletas": colunas_ausentes(dataset.schema.names),
+    }
+
+def registrar_versao(arquivo, nome=None):
+    """
+    Registra (ou atualiza) um parquet como versão do dataset
+
+    Args:
+        arquivo: Caminho do parquet
+        nome: Nome da versão (padrão: nome do arquivo sem extensão)
+
+    Returns:
+        dict: Entrada gravada no registro (com o caminho absoluto do arquivo)
+    """
+    arquivo = os.path.abspath(arquivo)
+    nome = nome or os.path.splitext(os.path.basename(arquivo))[0]
+    resumo = resumir_esquema(arquivo)
+    if "Filtros" in resumo["abas_incompletas"]:
+        raise ValueError(
+            f"{arquivo} não tem as dimensões do painel: {', '.join(resumo['abas_incompletas']['Filtros'])}"
+        )
+    info = os.stat(arquivo)
+    entrada = {
+        "nome": nome, "arquivo": arquivo, "hash": hash_arquivo(arquivo),
+        "tamanho": info.st_size, "mtime_ns": info.st_mtime_ns, **resumo
+    }
+    registro = copy.deepcopy(ler_registro())
+    registro["versoes"][nome] = entrada
+    gravar_registro(registro)
+    return entrada
+
+def ativar_versao(nome):
+    """
+    Troca a versão ativa (None volta às fontes padrão), sem reiniciar a aplicação
+
+    Os caches são chaveados por versao_dados: a troca passa a valer no próximo rerun
+    de cada sessão e os resultados da versão anterior deixam de ser usados.
+    """
+    registro = copy.deepcopy(ler_registro())
+    if nome is not None and nome not in registro["versoes"]:
+        raise ValueError(f"Versão não registrada: {nome}")
+    registro["ativa"] = nome
+    gravar_registro(registro)
+
+def precarregar_versao(nome, compacto=ARMAZENAMENTO_COMPACTO):
+    """
+    Grava o arquivo compartilhado (Arrow IPC) de uma versão antes de ativá-la
+
+    Com DADOS_COMPARTILHADOS, os processos no ar só mapeiam o arquivo quando a versão
+    é ativada, sem ler o parquet nem derivar as chaves de período.
+
+    Returns:
+        str: Caminho do arquivo gravado (ou já existente)
+    """
+    caminho = caminho_compartilhado(versao_dados(nome), compacto)
+    if not os.path.exists(caminho):
+        gravar_compartilhado(caminho, compacto, nome)
+    return caminho
+
+
+# ===== ESQUEMA =====
+def converter_monetaria(coluna):
+    """
+    Converte uma coluna Arrow para float64 com kernels do pyarrow.compute
+
+    Colunas numéricas/decimais são apenas convertidas; texto é limpo (remove tudo
+    que não for dígito, vírgula, ponto ou sinal e troca vírgula por ponto) e o que
+    não formar um número vira nulo. Infinitos também viram nulos.
+
+    Returns:
+        tuple: (array float64, máscara booleana das linhas inválidas)
+    """
+    if pa.types.is_string(coluna.type) or pa.types.is_large_string(coluna.type):
+        limpo = pc.replace_substring(pc.replace_substring_regex(coluna, r"[^\d,.\-]", ""), ",", ".")
+        numerico = pc.match_substring_regex(limpo, PADRAO_NUMERO)
+        convertida = pc.cast(pc.if_else(numerico, limpo, pa.scalar(None, limpo.type)), pa.float64())
+    else:
+        convertida = pc.cast(coluna, pa.float64())
+    convertida = pc.if_else(pc.is_finite(convertida), convertida, pa.scalar(None, pa.float64()))
+    invalidas = pc.and_(pc.is_valid(coluna), pc.is_null(convertida))
+    return convertida, invalidas
+
+def aplicar_esquema(tabela, colunas=COLUNAS_MONETARIAS):
+    """
+    Garante float64 nas colunas monetárias presentes na tabela Arrow
+
+    Executado uma vez por leitura (dentro do cache de carregar_aba): as abas recebem
+    colunas já numéricas e não fazem parsing de texto ao renderizar.
+
+    Returns:
+        tuple: (tabela convertida, dict coluna -> máscara das linhas inválidas)
+    """
+    invalidas = {}
+    for col in colunas:
+        if col not in tabela.column_names:
+            continue
+        convertida, invalidas[col] = converter_monetaria(tabela.column(col))
+        tabela = tabela.set_column(tabela.schema.get_field_index(col), col, convertida)
+    return tabela, invalidas
+
+def relatorio_esquema(tabela, colunas=COLUNAS_MONETARIAS, exemplos=3):
+    """
+    Relatório de validação das colunas monetárias
+
+    Returns:
+        DataFrame: Colunas 'coluna', 'tipo_origem', 'nulos', 'invalidas' e 'exemplos'
+        (unidade/competência das primeiras linhas inválidas)
+    """
+    tipos = {col: str(tabela.schema.field(col).type) for col in colunas if col in tabela.column_names}
+    _, invalidas = aplicar_esquema(tabela, colunas)
+    linhas = []
+    for col, mascara in invalidas.items():
+        ruins = tabela.filter(mascara)
+        identificacao = [
+            f"{linha.get('unidade', '?')} ({linha.get('competencia', '?')})"
+            for linha in ruins.slice(0, exemplos).to_pylist()
+        ]
+        linhas.append({
+            "coluna": col,
+            "tipo_origem": tipos[col],
+            "nulos": tabela.column(col).null_count,
+            "invalidas": ruins.num_rows,
+            "exemplos": "; ".join(identificacao)
+        })
+    return pd.DataFrame(linhas, columns=["coluna", "tipo_origem", "nulos", "invalidas", "exemplos"])
+
+def tipo_compacto(coluna):
+    """
+    Menor tipo Arrow que guarda a coluna na precisão usada pelo painel (None = manter)
+
+    float64 vira float32 (notas e índices de 0 a 1); decimais com até DIGITOS_FLOAT32
+    dígitos (percentuais) viram float32 e os maiores, float64; inteiros vão para o menor
+    tipo que comporta o mínimo e o máximo da coluna, se for mais estreito que o atual.
+    """
+    tipo = coluna.type
+    if pa.types.is_float64(tipo):
+        return pa.float32()
+    if pa.types.is_decimal(tipo):
+        return pa.float32() if tipo.precision <= DIGITOS_FLOAT32 else pa.float64()
+    if pa.types.is_integer(tipo):
+        extremos = pc.min_max(coluna)
+        minimo, maximo = extremos["min"].as_py() or 0, extremos["max"].as_py() or 0
+        for candidato in INTEIROS_COMPACTOS[minimo < 0]:
+            info = np.iinfo(candidato.to_pandas_dtype())
+            if info.min <= minimo and maximo <= info.max:
+                return candidato if candidato.bit_width < tipo.bit_width else None
+    return None
+
+def compactar_tabela(tabela, preservar=COLUNAS_MONETARIAS):
+    """Converte cada coluna da tabela Arrow para tipo_compacto (exceto as de preservar)"""
+    for i, col in enumerate(tabela.column_names):
+        if col in preservar:
+            continue
+        tipo = tipo_compacto(tabela.column(i))
+        if tipo is not None:
+            tabela = tabela.set_column(i, col, pc.cast(tabela.column(i), tipo, safe=False))
+    return tabela
+
+def aplicar_politica_nulos(tabela):
+    """
+    Converte a tabela Arrow para pandas aplicando COLUNAS_NULO_ZERO coluna a coluna
+
+    Colunas da política "zero" têm os nulos preenchidos no Arrow (pc.fill_null);
+    as demais colunas numéricas com nulos viram dtypes anuláveis (Float32, Int32...),
+    que guardam a máscara de nulos ao lado dos valores. Colunas sem nulos seguem em
+    numpy, sem máscara e sem cópia extra.
+    """
+    anulaveis = []
+    for i, col in enumerate(tabela.column_names):
+        coluna = tabela.column(i)
+        if not coluna.null_count:
+            continue
+        if col in COLUNAS_NULO_ZERO:
+            tabela = tabela.set_column(i, col, pc.fill_null(coluna, pa.scalar(0, coluna.type)))
+        elif coluna.type in TIPOS_ANULAVEIS:
+            anulaveis.append(col)
+    # Um bloco por coluna: colunas numéricas sem nulos referenciam os buffers Arrow
+    # (no modo compartilhado, as páginas do arquivo mapeado) em vez de serem copiadas
+    df = tabela.to_pandas(split_blocks=True)
+    for col in anulaveis:
+        df[col] = tabela.column(col).to_pandas(types_mapper=TIPOS_ANULAVEIS.get)
+    return df
+
+@st.cache_data(show_spinner=False)
+def validar_esquema(versao=None):
+    """
+    Linhas com valores monetários inválidos no dataset em uso, calculadas uma vez por versão
+
+    versao (versao_dados) entra só na chave do cache.
+
+    Returns:
+        DataFrame: Linhas de relatorio_esquema com ao menos um valor inválido
+    """
+    dataset = abrir_dataset()
+    colunas = colunas_origem(["unidade", "competencia"] + COLUNAS_MONETARIAS, dataset)
+    relatorio = relatorio_esquema(dataset.to_table(columns=colunas))
+    return relatorio[relatorio["invalidas"] > 0].reset_index(drop=True)
+
+
+# ===== DATASET COMPARTILHADO =====
+def preparar_tabela(tabela, compacto):
+    """Esquema, compactação e renomeações aplicados na tabela Arrow lida da fonte"""
+    # Colunas monetárias em float64 (inválidas viram NaN; ver validar_esquema)
+    tabela, _ = aplicar_esquema(tabela)
+    if compacto:
+        tabela = compactar_tabela(tabela)
+    return tabela.rename_columns([RENOMEAR_COLUNAS.get(col, col) for col in tabela.column_names])
+
+def caminho_compartilhado(versao, compacto):
+    """Arquivo IPC da versão dos dados (nome derivado da versão e do modo de armazenamento)"""
+    nome = hashlib.blake2b(repr((versao, compacto, VERSAO_PERIODOS)).encode(), digest_size=16).hexdigest()
+    return os.path.join(DIRETORIO_COMPARTILHADO, f"{nome}.arrow")
+
+def gravar_compartilhado(caminho, compacto, nome=None):
+    """
+    Grava a fonte em uso, já processada e ordenada por competência, como Arrow IPC
+
+    Sem compressão, para que os buffers possam ser mapeados diretamente. A gravação
+    é atômica (arquivo temporário + os.replace): processos concorrentes gravam o
+    mesmo conteúdo e o último a terminar prevalece. Arquivos de outras versões
+    (exceto o da versão ativa) são removidos; quem ainda os mapeia mantém o acesso
+    até liberá-los. nome grava uma versão registrada específica (precarregar_versao).
+    """
+    dataset = abrir_dataset(nome)
+    tabela = preparar_tabela(dataset.to_table(), compacto)
+    if not dataset_preparado(dataset):
+        tabela = pa.Table.from_pandas(aplicar_chaves_periodo(tabela.to_pandas()), preserve_index=False)
+    tabela = tabela.take(pc.sort_indices(pc.cast(tabela.column("competencia"), pa.string())))
+    metadados = dict(tabela.schema.metadata or {})
+    metadados[CHAVE_METADADOS] = str(VERSAO_PERIODOS).encode()
+    tabela = tabela.replace_schema_metadata(metadados)
+
+    os.makedirs(DIRETORIO_COMPARTILHADO, exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with pa.OSFile(temporario, "wb") as arquivo, ipc.new_file(arquivo, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    os.replace(temporario, caminho)
+    manter = {caminho, caminho_compartilhado(versao_dados(), compacto)}
+    for arquivo in os.listdir(DIRETORIO_COMPARTILHADO):
+        antigo = os.path.join(DIRETORIO_COMPARTILHADO, arquivo)
+        if arquivo.endswith(".arrow") and antigo not in manter:
+            os.remove(antigo)
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def dataset_compartilhado(versao=None, compacto=False):
+    """
+    Dataset pyarrow sobre o arquivo IPC da versão, lido por mapeamento de memória
+
+    O arquivo é gravado na primeira chamada de qualquer processo (gravar_compartilhado);
+    leituras sem filtro devolvem buffers que apontam para as páginas mapeadas.
+    versao (versao_dados) entra só na chave e no nome do arquivo.
+    """
+    caminho = caminho_compartilhado(versao, compacto)
+    if not os.path.exists(caminho):
+        gravar_compartilhado(caminho, compacto)
+    return ds.dataset(caminho, format="ipc", filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+# ===== CARREGAMENTO POR ABA =====
+def carregar_aba(aba, empresa=None, coluna_periodo=None, valor_periodo=None, competencias=None):
+    """
+    Carrega apenas as colunas e linhas necessárias para uma aba
+
+    Args:
+        aba: Chave de COLUNAS_POR_ABA
+        empresa: Empresa usada no filtro de leitura (None = todas)
+        coluna_periodo: Coluna de período do filtro de leitura (None = todos os períodos)
+        valor_periodo: Valor do período selecionado
+        competencias: Janela de competências a ler (None = todas; ver janela_competencias)
+
+    Returns:
+        IndiceDados: Projeção processada, ordenada por competência, com o índice de linhas
+    """
+    competencias = tuple(competencias) if competencias is not None else None
+    if DADOS_COMPARTILHADOS:
+        return carregar_aba_compartilhada(
+            aba, empresa, coluna_periodo, valor_periodo, competencias,
+            versao_dados(), ARMAZENAMENTO_COMPACTO
+        )
+    return carregar_aba_versao(
+        aba, empresa, coluna_periodo, valor_periodo, competencias,
+        versao_fatia(empresa, coluna_periodo, valor_periodo, competencias), ARMAZENAMENTO_COMPACTO
+    )
+
+@st.cache_data(show_spinner=False)
+def carregar_aba_versao(aba, empresa, coluna_periodo, valor_periodo, competencias, versao, compacto=False):
+    """
+    Leitura em cache de carregar_aba; versao (das partições lidas) entra só na chave
+
+    compacto aplica compactar_tabela (ver ARMAZENAMENTO_COMPACTO) antes da conversão.
+    """
+    dataset = abrir_dataset()
+    colunas = colunas_origem(COLUNAS_POR_ABA[aba], dataset)
+    tabela = dataset.to_table(
+        columns=colunas,
+        filter=montar_filtro(dataset, empresa, coluna_periodo, valor_periodo, competencias)
+    )
+    return montar_indice(
+        preparar_tabela(tabela, compacto), aba,
+        (versao, aba, empresa, coluna_periodo, valor_periodo, competencias, compacto),
+        dataset_preparado(dataset)
+    )
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_PROJECOES_COMPARTILHADAS)
+def carregar_aba_compartilhada(aba, empresa, coluna_periodo, valor_periodo, competencias, versao, compacto=False):
+    """
+    carregar_aba no modo DADOS_COMPARTILHADOS: projeção lida do arquivo IPC mapeado
+
+    Em st.cache_resource, todas as sessões recebem o mesmo IndiceDados (sem pickle a
+    cada acerto de cache). Sem filtro, as colunas numéricas apontam para as páginas do
+    arquivo; com filtro (empresa, período ou janela), as linhas selecionadas são
+    copiadas uma vez e a cópia é compartilhada entre as sessões.
+    """
+    dataset = dataset_compartilhado(versao, compacto)
+    tabela = dataset.to_table(
+        columns=[col for col in COLUNAS_POR_ABA[aba] if col in dataset.schema.names],
+        filter=montar_filtro(dataset, empresa, coluna_periodo, valor_periodo, competencias)
+    )
+    return montar_indice(
+        tabela, aba, (versao, aba, empresa, coluna_periodo, valor_periodo, competencias, compacto)
+    )
+
+def montar_indice(tabela, aba, versao, preparado=True):
+    """Converte a tabela preparada de uma aba em IndiceDados (nulos, categorias e ordenação)"""
+    # Nulos tratados por coluna (zero ou máscara), sem preenchimento do DataFrame inteiro
+    df = aplicar_politica_nulos(tabela)
+
+    # Chaves de período só são derivadas quando o parquet preparado não está disponível
+    if not preparado:
+        df = aplicar_chaves_periodo(df)
+
+    df = converter_categoricas(df)
+
+    # Conversões numéricas em batch
+    for col in COLUNAS_NUMERICAS:
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    # O arquivo compartilhado já vem ordenado: evita a cópia da ordenação
+    if not df["competencia"].is_monotonic_increasing:
+        df.sort_values(by="competencia", kind="stable", inplace=True)
+    return IndiceDados(df, versao=versao, colunas_agregadas=COLUNAS_AGREGADAS.get(aba))
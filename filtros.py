@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 
+from periodos import COLUNA_PERIODO_MAP, garantir_chaves_periodo
+
 # ==============================
 # Constantes globais
 # ==============================
@@ -24,8 +26,6 @@ BASE_LABELS = {
     "nota_capacidade_produtiva": "Capacidade Produtiva",
 }
 
-FILTRO_COL_MAP = {"Mês": "competencia", "Semestre": "ano_semestre", "Ano": "ano", "Trimestre": "trimestre"}
-
 VALORES_PADRAO = {"competencia": "2024-01", "ano_semestre": "2024-1", "ano": "2024", "trimestre": "2024-1"}
 
 CONSELHO_PADRAO = "CRES"
@@ -43,17 +43,9 @@ def criar_nome_map():
                 nome_map[f"{base}{suf}_padronizada"] = label
     return nome_map
 
-@st.cache_data
 def processar_dados_temporais(df):
-    df = df.copy()
-    df["competencia"] = df["competencia"].astype(str)
-    df["ano"] = df["competencia"].str[:4]
-    df["mes"] = df["competencia"].str[5:7].astype(int)
-    df["semestre"] = (df["mes"] > 6).astype(int) + 1
-    df["trimestre_mes"] = ((df["mes"] - 1) // 3 + 1).astype(str)
-    df["trimestre"] = df["ano"] + "-" + df["trimestre_mes"]
-    df["ano_semestre"] = df["ano"] + "-" + df["semestre"].astype(str)
-    return df
+    """Chaves de período vêm prontas do parquet preparado (ver periodos.py)"""
+    return garantir_chaves_periodo(df)
 
 def seletor_peso_otimizado(label, key=None):
     idx_default = max(PESO_DEFAULT.get(label, 1) - 1, 0)
@@ -68,7 +60,9 @@ def aplicar_filtros_avancados(df_empresa, conselho_sel, tipologia_sel, unidade_s
         mask &= (df_empresa["tipologia"] == tipologia_sel)
     if unidade_sel != "Todas":
         mask &= (df_empresa["unidade"] == unidade_sel)
-    return df_empresa[mask].copy()
+    # Sem filtro efetivo, cópia rasa da projeção (Copy-on-Write: sem copiar dados, e
+    # colunas criadas pelo chamador não alteram a projeção em cache)
+    return df_empresa.copy(deep=False) if mask.all() else df_empresa[mask]
 
 # ==============================
 # CSS — Popover responsivo
@@ -130,8 +124,8 @@ def sidebar_filtros(df):
         with col2:
             agrupamento_opcao = st.radio("Agrupar por", ["Mês", "Trimestre", "Semestre", "Ano"], index=3)
 
-        filtro_col = FILTRO_COL_MAP[agrupamento_opcao]
-        df_empresa = df[df["empresa"] == empresa_sel].copy()
+        filtro_col = COLUNA_PERIODO_MAP[agrupamento_opcao]
+        df_empresa = df[df["empresa"] == empresa_sel]
 
         # Período
         opcoes = sorted(df_empresa[filtro_col].dropna().unique())
@@ -196,25 +190,15 @@ def sidebar_filtros(df):
                 )
 
 
-    # Aplicar sufixos e preparar dados
+    # Aplicar sufixos (os dados de cada aba são carregados em dados.carregar_aba)
     sufixo = SUFIXO_MAP.get(filtro_col, "")
     colunas_x = [col + sufixo for col in colunas_x_base]
     colunas_y = [col + sufixo for col in colunas_y_base]
 
-    # Conversões numéricas batch
-    colunas_numericas = colunas_x + colunas_y + ["idade_unidade"]
-    colunas_existentes = [col for col in colunas_numericas if col in df_empresa.columns]
-    if colunas_existentes:
-        df_empresa[colunas_existentes] = df_empresa[colunas_existentes].apply(pd.to_numeric, errors="coerce")
-
-    # Filtro principal
-    df_filtrado = df_empresa[df_empresa[filtro_col] == str(competencia_sel)].copy()
-    df_filtrado = aplicar_filtros_avancados(df_filtrado, conselho_sel, tipologia_sel, unidade_sel)
-
     return (
-        df_filtrado, empresa_sel, str(competencia_sel), agrupamento_opcao,
+        empresa_sel, str(competencia_sel), agrupamento_opcao,
         conselho_sel, unidade_sel, tipologia_sel, colunas_x, pesos_x,
-        colunas_y, pesos_y, filtro_col, df_empresa, nome_map
+        colunas_y, pesos_y, filtro_col, nome_map
     )
 
 # ==============================
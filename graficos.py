@@ -4,6 +4,8 @@ import pandas as pd
 import streamlit as st
 import numpy as np
 
+from dados import HASH_DADOS
+
 CORES_PADROES = {
     "meta": "#81a4cd",
     "realizado_bom": "#588157",
@@ -21,23 +23,11 @@ LAYOUT_CONFIG = {
 
 # ===== FUNÇÕES UTILITÁRIAS =====
 def filtrar_dados_base(df, empresa_sel, unidade_sel=None):
-    """Filtragem básica otimizada"""
-   
-    
+    """Filtragem básica otimizada (sem cópia: pandas Copy-on-Write)"""
     mask = df["empresa"] == empresa_sel
     if unidade_sel and unidade_sel != "Todas":
         mask &= df["unidade"] == unidade_sel
-    return df[mask].copy()
-
-def converter_colunas_numericas(df, colunas):
-    """Converte múltiplas colunas para numéricas de forma otimizada"""
-    for col in colunas:
-        if col in df.columns:
-            df[col] = pd.to_numeric(
-                df[col].astype(str).str.replace(r"[^\d,.-]", "", regex=True).str.replace(",", "."),
-                errors="coerce"
-            ).fillna(0)
-    return df
+    return df.copy(deep=False) if mask.all() else df[mask]
 
 def criar_card_html(titulo, valor, cor="rgba(0, 48, 124, 0.7)"):
     """Cria HTML para cards padronizado"""
@@ -51,10 +41,10 @@ def criar_card_html(titulo, valor, cor="rgba(0, 48, 124, 0.7)"):
 
 
 # ===== GRÁFICOS DE SÉRIE TEMPORAL =====
-@st.cache_data
-def grafico_nota_producao_series(df, empresa_sel, unidade_sel):
+@st.cache_data(hash_funcs=HASH_DADOS)
+def grafico_nota_producao_series(dados, empresa_sel, unidade_sel):
     """Série temporal mostrando o valor da coluna 'nota_producao' visível em todos os markers."""
-    df_filtrado = filtrar_dados_base(df, empresa_sel, unidade_sel).copy()
+    df_filtrado = filtrar_dados_base(dados.df, empresa_sel, unidade_sel)
 
     # garantir formato e ordenação
     df_filtrado["competencia"] = df_filtrado["competencia"].astype(str)
@@ -106,21 +96,10 @@ def grafico_nota_producao_series(df, empresa_sel, unidade_sel):
 
 
 # ===== GRÁFICOS DE CUSTO =====
-@st.cache_data
-def processar_dados_custo(df, empresa_sel, unidade_sel):
-    """Processa dados de custo com cache"""
-    df_filtrado = filtrar_dados_base(df, empresa_sel, unidade_sel)
-    
-    # Garante todas as competências
-    todas_competencias = pd.DataFrame(sorted(df["competencia"].unique()), columns=["competencia"])
-    
-    # Agrupamento otimizado
-    df_custo = df_filtrado.groupby("competencia", as_index=False)[
-        ["soma_custo_realizado", "soma_meta"]
-    ].sum()
-    
-    # Merge otimizado
-    df_resultado = todas_competencias.merge(df_custo, on="competencia", how="left").fillna(0)
+@st.cache_data(hash_funcs=HASH_DADOS)
+def processar_dados_custo(dados, empresa_sel, unidade_sel):
+    """Processa dados de custo com cache (fatia do agregado por competência)"""
+    df_resultado = dados.agregado.serie(empresa_sel, unidade_sel)
     df_resultado["cor_realizado"] = np.where(
         df_resultado["soma_custo_realizado"] > df_resultado["soma_meta"],
         CORES_PADROES["realizado_ruim"], 
@@ -129,9 +108,9 @@ def processar_dados_custo(df, empresa_sel, unidade_sel):
     
     return df_resultado
 
-def grafico_custo_realizado_vs_meta(df, empresa_sel, unidade_sel, competencia_sel):
+def grafico_custo_realizado_vs_meta(dados, empresa_sel, unidade_sel, competencia_sel):
     """Gráfico de custo vs meta otimizado"""
-    df_custo = processar_dados_custo(df, empresa_sel, unidade_sel)
+    df_custo = processar_dados_custo(dados, empresa_sel, unidade_sel)
     
     fig = go.Figure()
     
@@ -244,19 +223,14 @@ def grafico_despesa_realizada_vs_prevista(despesa_prevista, despesa_liquidada):
     )
 
 # ===== CARDS ORÇAMENTÁRIOS =====
-def exibir_cards_orcamentarios(df, empresa_sel, unidade_sel, competencia_sel, coluna_periodo):
-    """Cards orçamentários otimizados"""
-    df_filtrado = filtrar_dados_base(df, empresa_sel, unidade_sel)
-    df_filtrado = df_filtrado[df_filtrado[coluna_periodo] == competencia_sel]
-    
-    colunas_valores = [
-        "receita_prevista", "receita_realizada",
-        "despesa_prevista", "despesa_liquidada",
-        "proposta", "execucao_orcamentaria"
-    ]
-    
-    df_filtrado = converter_colunas_numericas(df_filtrado, colunas_valores)
+def exibir_cards_orcamentarios(dados, empresa_sel, unidade_sel, competencia_sel, coluna_periodo):
+    """Cards orçamentários otimizados (fatia obtida pelo índice de linhas)"""
+    df_filtrado = dados.fatia(
+        empresa_sel, coluna_periodo, competencia_sel,
+        unidade_sel if unidade_sel and unidade_sel != "Todas" else None
+    )
     
+    # Colunas monetárias já chegam em float64 (dados.aplicar_esquema)
     # Cálculos agregados
     metricas = {
         "receita_prevista": df_filtrado["receita_prevista"].sum(),
@@ -320,29 +294,18 @@ def exibir_cards_orcamentarios(df, empresa_sel, unidade_sel, competencia_sel, co
         st.plotly_chart(fig_despesa, use_container_width=True)
 
 # ===== FLUXO DE CAIXA =====
-@st.cache_data
-def processar_dados_fluxo_caixa(df, empresa_sel, unidade_sel):
-    """Processa dados de fluxo de caixa com cache"""
-    df_filtrado = filtrar_dados_base(df, empresa_sel, unidade_sel)
-    
-    # Garante todas as competências
-    todas_competencias = pd.DataFrame(sorted(df["competencia"].unique()), columns=["competencia"])
-    
-    # Agrupamento
-    df_fluxo = df_filtrado.groupby("competencia", as_index=False)[
-        ["receitas", "despesas"]
-    ].sum()
-    
-    # Merge e cores
-    df_resultado = todas_competencias.merge(df_fluxo, on="competencia", how="left").fillna(0)
+@st.cache_data(hash_funcs=HASH_DADOS)
+def processar_dados_fluxo_caixa(dados, empresa_sel, unidade_sel):
+    """Processa dados de fluxo de caixa com cache (fatia do agregado por competência)"""
+    df_resultado = dados.agregado.serie(empresa_sel, unidade_sel)
     df_resultado["cor_receita"] = CORES_PADROES["receita"]
     df_resultado["cor_despesa"] = CORES_PADROES["despesa"]
     
     return df_resultado
 
-def grafico_fluxo_caixa(df, empresa_sel, unidade_sel, competencia_sel, coluna_periodo):
+def grafico_fluxo_caixa(dados, empresa_sel, unidade_sel, competencia_sel, coluna_periodo):
     """Gráfico de fluxo de caixa otimizado"""
-    df_fluxo = processar_dados_fluxo_caixa(df, empresa_sel, unidade_sel)
+    df_fluxo = processar_dados_fluxo_caixa(dados, empresa_sel, unidade_sel)
     
     fig = go.Figure()
     
@@ -399,14 +362,14 @@ def grafico_fluxo_caixa(df, empresa_sel, unidade_sel, competencia_sel, coluna_pe
     
     return fig
 
-def exibir_cards_fluxo_caixa(df, empresa_sel, unidade_sel, competencia_sel, coluna_periodo):
-    """Cards de fluxo de caixa otimizados"""
-    df_filtrado = filtrar_dados_base(df, empresa_sel, unidade_sel)
-    df_filtrado = df_filtrado[df_filtrado[coluna_periodo] == competencia_sel]
-    
-    colunas_valores = ["receitas", "despesas"]
-    df_filtrado = converter_colunas_numericas(df_filtrado, colunas_valores)
+def exibir_cards_fluxo_caixa(dados, empresa_sel, unidade_sel, competencia_sel, coluna_periodo):
+    """Cards de fluxo de caixa otimizados (fatia obtida pelo índice de linhas)"""
+    df_filtrado = dados.fatia(
+        empresa_sel, coluna_periodo, competencia_sel,
+        unidade_sel if unidade_sel and unidade_sel != "Todas" else None
+    )
     
+    # receitas/despesas já chegam em float64 (dados.aplicar_esquema)
     receita = df_filtrado["receitas"].sum()
     despesa = df_filtrado["despesas"].sum()
     saldo = (receita / despesa) * 100 if despesa > 0 else 0
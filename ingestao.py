@@ -0,0 +1,250 @@
+"""
+Ingestão incremental do dataset particionado de indicadores.
+
+O dataset fica em DIRETORIO_PARTICOES no layout hive empresa=/ano=/competencia=,
+com um arquivo por partição e um manifesto (_manifesto.json) com o hash de cada
+partição. Uma nova competência grava apenas as suas partições e atualiza o
+manifesto; a aplicação invalida somente os caches das fatias que as incluem
+(ver dados.versao_fatia).
+
+Com --padronizar, as colunas *_padronizada são recalculadas por padronizacao.py:
+as estatísticas ficam em _padronizacao.json e, a cada anexação, só os grupos de
+período tocados são atualizados (e só as partições desses grupos regravadas).
+
+Uso:
+    python ingestao.py inicializar [origem]
+    python ingestao.py anexar novo.parquet [--substituir] [--padronizar [minmax|zscore]]
+    python ingestao.py padronizar [--metodo minmax|zscore]
+    python ingestao.py listar
+"""
+import argparse
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pandas.api.types import CategoricalDtype
+
+from dados import (
+    ARQUIVO_ORIGEM, ARQUIVO_PARTICAO, COLUNAS_PARTICAO, DIRETORIO_PARTICOES,
+    abrir_particoes, caminho_manifesto, hash_arquivo, ler_manifesto
+)
+from padronizacao import METODOS, EstatisticasPadronizacao, competencias_afetadas
+from periodos import CHAVE_METADADOS, VERSAO_PERIODOS, derivar_chaves_periodo
+from preparar_dados import preparar_dataframe
+
+ARQUIVO_PADRONIZACAO = "_padronizacao.json"
+
+
+# ===== MANIFESTO =====
+def manifesto_vazio():
+    return {"versao": 0, "versao_periodos": VERSAO_PERIODOS, "particoes": {}}
+
+def gravar_manifesto(manifesto, diretorio=DIRETORIO_PARTICOES):
+    """Grava o manifesto de forma atômica (arquivo temporário + os.replace)"""
+    destino = caminho_manifesto(diretorio)
+    temporario = destino + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temporario, destino)
+
+
+# ===== PARTIÇÕES =====
+def caminho_particao(empresa, ano, competencia):
+    """Caminho relativo (hive) da partição"""
+    return f"empresa={empresa}/ano={ano}/competencia={competencia}"
+
+def schema_particoes(df, diretorio, manifesto):
+    """
+    Schema das partições (sem as colunas de partição)
+
+    Reaproveita o schema das partições já gravadas, para que novas competências
+    não divirjam em tipos; na primeira gravação, deriva do próprio DataFrame.
+    """
+    if manifesto["particoes"]:
+        primeira = next(iter(sorted(manifesto["particoes"])))
+        return pq.read_schema(os.path.join(diretorio, primeira, ARQUIVO_PARTICAO))
+    schema = pa.Schema.from_pandas(df.drop(columns=COLUNAS_PARTICAO), preserve_index=False)
+    metadados = dict(schema.metadata or {})
+    metadados[CHAVE_METADADOS] = str(VERSAO_PERIODOS).encode()
+    return schema.with_metadata(metadados)
+
+def gravar_particoes(df, diretorio=DIRETORIO_PARTICOES, substituir=False):
+    """
+    Grava uma partição por (empresa, ano, competencia) do DataFrame preparado
+
+    Args:
+        df: DataFrame já preparado (preparar_dataframe)
+        diretorio: Raiz do dataset particionado
+        substituir: Regrava partições já existentes (caso contrário, aborta)
+
+    Returns:
+        list: Caminhos relativos das partições gravadas
+    """
+    manifesto = ler_manifesto(diretorio) if os.path.exists(caminho_manifesto(diretorio)) else manifesto_vazio()
+
+    # Dimensões vão como texto: dicionários por arquivo divergiriam entre partições
+    for col in df.columns:
+        if isinstance(df[col].dtype, CategoricalDtype):
+            df[col] = df[col].astype(str)
+
+    grupos = df.groupby(COLUNAS_PARTICAO, sort=True)
+    caminhos = [caminho_particao(*chave) for chave in grupos.groups]
+    existentes = [c for c in caminhos if c in manifesto["particoes"]]
+    if existentes and not substituir:
+        raise ValueError(
+            f"{len(existentes)} partição(ões) já existem (ex.: {existentes[0]}); "
+            "use --substituir para regravá-las"
+        )
+
+    schema = schema_particoes(df, diretorio, manifesto)
+    for (empresa, ano, competencia), grupo in grupos:
+        relativo = caminho_particao(empresa, ano, competencia)
+        os.makedirs(os.path.join(diretorio, relativo), exist_ok=True)
+        caminho = os.path.join(diretorio, relativo, ARQUIVO_PARTICAO)
+        tabela = pa.Table.from_pandas(
+            grupo.drop(columns=COLUNAS_PARTICAO)[schema.names], schema=schema, preserve_index=False
+        )
+        # Grava ao lado com prefixo "_" (ignorado pelo pyarrow) e troca de forma atômica
+        temporario = os.path.join(diretorio, relativo, f"_{ARQUIVO_PARTICAO}.{os.getpid()}.tmp")
+        pq.write_table(tabela, temporario)
+        os.replace(temporario, caminho)
+        manifesto["particoes"][relativo] = {
+            "empresa": empresa, "ano": ano, "competencia": competencia,
+            "linhas": tabela.num_rows, "hash": hash_arquivo(caminho)
+        }
+
+    manifesto["versao"] += 1
+    gravar_manifesto(manifesto, diretorio)
+    return caminhos
+
+
+def ler_particoes(diretorio=DIRETORIO_PARTICOES, empresas_competencias=None):
+    """Lê partições gravadas (todas ou apenas os pares (empresa, competencia) informados)"""
+    filtro = None
+    if empresas_competencias is not None:
+        for empresa, competencia in sorted(empresas_competencias):
+            par = (ds.field("empresa") == empresa) & (ds.field("competencia") == competencia)
+            filtro = par if filtro is None else filtro | par
+    return abrir_particoes(diretorio).to_table(filter=filtro).to_pandas()
+
+
+# ===== PADRONIZAÇÃO =====
+def caminho_padronizacao(diretorio=DIRETORIO_PARTICOES):
+    return os.path.join(diretorio, ARQUIVO_PADRONIZACAO)
+
+def carregar_estatisticas(diretorio, metodo):
+    """Estatísticas salvas; na ausência (ou troca de método), montadas a partir das partições"""
+    caminho = caminho_padronizacao(diretorio)
+    if os.path.exists(caminho):
+        estatisticas = EstatisticasPadronizacao.carregar(caminho)
+        if estatisticas.metodo == metodo:
+            return estatisticas
+    estatisticas = EstatisticasPadronizacao(metodo)
+    estatisticas.atualizar(ler_particoes(diretorio))
+    return estatisticas
+
+def regravar_padronizadas(estatisticas, pares, diretorio=DIRETORIO_PARTICOES):
+    """Recalcula as colunas padronizadas das partições (empresa, competencia) informadas"""
+    if not pares:
+        return []
+    df = estatisticas.padronizar(ler_particoes(diretorio, pares))
+    return gravar_particoes(df, diretorio, substituir=True)
+
+def tabela_competencias(diretorio=DIRETORIO_PARTICOES):
+    """Competências do manifesto com as respectivas chaves de período"""
+    competencias = pd.Series(sorted({
+        info["competencia"] for info in ler_manifesto(diretorio)["particoes"].values()
+    }))
+    return derivar_chaves_periodo(competencias).assign(competencia=competencias)
+
+
+# ===== COMANDOS =====
+def inicializar(origem=ARQUIVO_ORIGEM, diretorio=DIRETORIO_PARTICOES):
+    """Particiona um snapshot completo (bruto ou preparado) em um diretório vazio"""
+    if os.path.exists(caminho_manifesto(diretorio)):
+        raise ValueError(f"{diretorio} já foi inicializado; use 'anexar'")
+    return gravar_particoes(preparar_dataframe(pd.read_parquet(origem)), diretorio)
+
+def anexar(arquivo, diretorio=DIRETORIO_PARTICOES, substituir=False, padronizar=None):
+    """
+    Anexa as competências de um parquet novo sem regravar as partições existentes
+
+    Com padronizar (método de padronizacao.METODOS), recalcula as colunas padronizadas
+    das linhas novas e regrava apenas as partições já existentes cujos grupos de
+    período tiveram as estatísticas alteradas.
+
+    Returns:
+        tuple: (partições anexadas, partições regravadas pela padronização)
+    """
+    if not os.path.exists(caminho_manifesto(diretorio)):
+        raise ValueError(f"{diretorio} não inicializado; use 'inicializar'")
+    df = preparar_dataframe(pd.read_parquet(arquivo))
+    if not padronizar:
+        return gravar_particoes(df, diretorio, substituir), []
+
+    estatisticas = carregar_estatisticas(diretorio, padronizar)
+    alterados = estatisticas.atualizar(df)
+    novos = set(zip(df["empresa"].astype(str), df["competencia"].astype(str)))
+    df = estatisticas.padronizar(df)
+    anexadas = gravar_particoes(df, diretorio, substituir)
+
+    afetadas = competencias_afetadas(alterados, tabela_competencias(diretorio)) - novos
+    regravadas = regravar_padronizadas(estatisticas, afetadas, diretorio)
+    estatisticas.salvar(caminho_padronizacao(diretorio))
+    return anexadas, regravadas
+
+def padronizar_tudo(metodo="minmax", diretorio=DIRETORIO_PARTICOES):
+    """Recalcula do zero as estatísticas e as colunas padronizadas de todas as partições"""
+    df = ler_particoes(diretorio)
+    estatisticas = EstatisticasPadronizacao(metodo)
+    estatisticas.atualizar(df)
+    gravadas = gravar_particoes(estatisticas.padronizar(df), diretorio, substituir=True)
+    estatisticas.salvar(caminho_padronizacao(diretorio))
+    return gravadas
+
+def listar(diretorio=DIRETORIO_PARTICOES):
+    manifesto = ler_manifesto(diretorio)
+    print(f"Versão {manifesto['versao']} | {len(manifesto['particoes'])} partições")
+    for relativo, info in sorted(manifesto["particoes"].items()):
+        print(f"  {relativo}: {info['linhas']} linhas ({info['hash'][:12]})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestão incremental do dataset particionado")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_inicializar = subparsers.add_parser("inicializar", help="particiona um snapshot completo")
+    p_inicializar.add_argument("origem", nargs="?", default=ARQUIVO_ORIGEM)
+
+    p_anexar = subparsers.add_parser("anexar", help="anexa novas competências")
+    p_anexar.add_argument("arquivo")
+    p_anexar.add_argument("--substituir", action="store_true",
+                          help="regrava partições que já existem")
+    p_anexar.add_argument("--padronizar", nargs="?", const="minmax", choices=METODOS,
+                          help="recalcula as colunas *_padronizada dos grupos afetados")
+
+    p_padronizar = subparsers.add_parser("padronizar", help="recalcula todas as colunas padronizadas")
+    p_padronizar.add_argument("--metodo", choices=METODOS, default="minmax")
+
+    subparsers.add_parser("listar", help="lista as partições do manifesto")
+    args = parser.parse_args()
+
+    try:
+        if args.comando == "inicializar":
+            gravadas = inicializar(args.origem)
+            print(f"✅ {len(gravadas)} partições gravadas em {DIRETORIO_PARTICOES}")
+        elif args.comando == "anexar":
+            gravadas, regravadas = anexar(args.arquivo, substituir=args.substituir, padronizar=args.padronizar)
+            print(f"✅ {len(gravadas)} partições anexadas: {', '.join(gravadas)}")
+            if args.padronizar:
+                print(f"   {len(regravadas)} partições regravadas pela padronização")
+        elif args.comando == "padronizar":
+            gravadas = padronizar_tudo(args.metodo)
+            print(f"✅ {len(gravadas)} partições padronizadas ({args.metodo})")
+        else:
+            listar()
+    except ValueError as erro:
+        parser.exit(1, f"❌ {erro}\n")
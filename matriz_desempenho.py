@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
@@ -51,22 +53,116 @@ def colorir_nota_otimizado(valor):
         if condicao(valor):
             return f"<span style='color:{cor}'>{valor:.2f}</span>"
 
+# Limiares/cores de colorir_nota_otimizado em forma de tabela (uso vetorizado)
+LIMIARES_NOTA = np.array([0.3, 0.5, 0.75, 0.9, 1.0])
+CORES_NOTA = ["#e64937", "#e06666", "#d6d304", "#2cd147", "#1071d2", "#0066cc"]
+PREFIXOS_NOTA = np.array([f"<span style='color:{cor}'>" for cor in CORES_NOTA])
+NOTA_NA_HTML = "<span style='color:#999999'>N/A</span>"
+CENTESIMOS_TEXTO = np.array([f"{i:02d}" for i in range(100)])
+
+def formatar_duas_casas(notas):
+    """
+    Equivalente vetorizado de f"{valor:.2f}" para um array float64
+
+    Arredonda em centésimos com aritmética inteira; valores muito próximos de um
+    empate (x.xx5), não finitos ou muito grandes caem no formatador do Python para
+    manter a saída idêntica.
+    """
+    with np.errstate(invalid="ignore"):
+        centesimos = notas * 100
+        empate = np.abs(centesimos - np.floor(centesimos) - 0.5) < 1e-6
+        fallback = ~np.isfinite(notas) | (np.abs(notas) >= 1e6) | empate
+        inteiros = np.abs(np.where(fallback, 0, np.floor(centesimos + 0.5))).astype(np.int64)
+
+    textos = np.char.add(np.char.add((inteiros // 100).astype(str), "."), CENTESIMOS_TEXTO[inteiros % 100])
+    textos = np.where(np.signbit(notas), np.char.add("-", textos), textos)
+    if fallback.any():
+        textos[fallback] = np.char.mod("%.2f", notas[fallback])
+    return textos
+
+def colorir_notas_vetorizado(valores):
+    """
+    Versão vetorizada de colorir_nota_otimizado (mesma saída, elemento a elemento)
+
+    Args:
+        valores: Series/array com as notas
+
+    Returns:
+        np.ndarray: Spans HTML coloridos, um por valor
+    """
+    notas = pd.Series(valores).to_numpy(dtype="float64", na_value=np.nan)
+    faixas = np.digitize(notas, LIMIARES_NOTA)
+    spans = np.char.add(
+        np.char.add(PREFIXOS_NOTA[faixas], formatar_duas_casas(notas)), "</span>"
+    ).astype(object)
+    spans[np.isnan(notas)] = NOTA_NA_HTML
+    return spans
+
+def montar_matriz_indicadores(df, colunas):
+    """Bloco (unidades × indicadores) em float32; colunas ausentes viram 0 e notas nulas, NaN"""
+    return df.reindex(columns=colunas, fill_value=0).to_numpy(dtype=np.float32, na_value=np.nan)
+
+def montar_matriz_pesos(pesos_x, pesos_y):
+    """Matriz de pesos (2 × indicadores): linha 0 pondera o bloco X, linha 1 o bloco Y"""
+    n_x = len(pesos_x)
+    pesos = np.zeros((2, n_x + len(pesos_y)), dtype=np.float32)
+    pesos[0, :n_x] = pesos_x
+    pesos[1, n_x:] = pesos_y
+    return pesos
+
+def calcular_eixos_matriz(matriz, pesos):
+    """
+    Calcula os eixos com um único produto matricial
+
+    Args:
+        matriz: Bloco (unidades × indicadores) de montar_matriz_indicadores
+        pesos: Pesos brutos (eixos × indicadores) ou (cenários × eixos × indicadores);
+            cada linha é normalizada pela própria soma
+
+    Notas nulas (NaN) saem da média: nas linhas com nulos, o eixo é renormalizado
+    pelos pesos das notas presentes.
+
+    Returns:
+        np.ndarray: (unidades × eixos) ou (cenários × unidades × eixos); NaN onde a soma
+        dos pesos é 0 ou a linha não tem nota em nenhum indicador do eixo
+    """
+    pesos = np.asarray(pesos, dtype=np.float32)
+    soma = pesos.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalizados = np.where(soma[..., None] != 0, pesos / soma[..., None], 0).astype(np.float32)
+    transpostos = np.swapaxes(normalizados, -1, -2)
+    nulos = np.isnan(matriz)
+    if not nulos.any():
+        eixos = matriz @ transpostos
+    else:
+        eixos = np.where(nulos, 0, matriz) @ transpostos
+        cobertura = (~nulos).astype(np.float32) @ transpostos
+        with np.errstate(divide="ignore", invalid="ignore"):
+            eixos = np.where(nulos.any(axis=-1)[:, None], eixos / cobertura, eixos)
+    return np.where((soma == 0)[..., None, :], np.nan, eixos).astype(np.float32)
+
+def calcular_eixos_cenarios(df, colunas_x, colunas_y, cenarios):
+    """
+    Avalia vários esquemas de pesos de uma vez sobre o mesmo bloco de indicadores
+
+    Args:
+        df: DataFrame já filtrado
+        colunas_x, colunas_y: Indicadores de cada eixo
+        cenarios: Lista de pares (pesos_x, pesos_y)
+
+    Returns:
+        np.ndarray: (cenários × unidades × 2) com eixo_x/eixo_y de cada cenário
+    """
+    matriz = montar_matriz_indicadores(df, colunas_x + colunas_y)
+    pesos = np.stack([montar_matriz_pesos(px_, py_) for px_, py_ in cenarios])
+    return calcular_eixos_matriz(matriz, pesos)
+
 def calcular_eixos_vetorizado(df, colunas_x, pesos_x, colunas_y, pesos_y):
-    """Cálculo vetorizado dos eixos para melhor performance"""
-    # Eixo X
-    soma_ponderada_x = pd.Series(0, index=df.index, dtype=float)
-    for col, peso in zip(colunas_x, pesos_x):
-        if col in df.columns:
-            soma_ponderada_x += df[col].fillna(0) * peso
-    df["eixo_x"] = soma_ponderada_x / sum(pesos_x)
-    
-    # Eixo Y
-    soma_ponderada_y = pd.Series(0, index=df.index, dtype=float)
-    for col, peso in zip(colunas_y, pesos_y):
-        if col in df.columns:
-            soma_ponderada_y += df[col].fillna(0) * peso
-    df["eixo_y"] = soma_ponderada_y / sum(pesos_y)
-    
+    """Cálculo vetorizado dos eixos: um produto matriz × pesos para X e Y"""
+    matriz = montar_matriz_indicadores(df, colunas_x + colunas_y)
+    eixos = calcular_eixos_matriz(matriz, montar_matriz_pesos(pesos_x, pesos_y))
+    df["eixo_x"] = eixos[:, 0]
+    df["eixo_y"] = eixos[:, 1]
     return df
 
 def preparar_dados_hover(df, colunas_x, colunas_y, nome_map):
@@ -74,14 +170,14 @@ def preparar_dados_hover(df, colunas_x, colunas_y, nome_map):
     custom_cols = ["hover_x", "hover_y", "idade_unidade"]
     
     # Hover para eixos principais
-    df["hover_x"] = df["eixo_x"].fillna(0).apply(colorir_nota_otimizado)
-    df["hover_y"] = df["eixo_y"].fillna(0).apply(colorir_nota_otimizado)
+    df["hover_x"] = colorir_notas_vetorizado(df["eixo_x"])
+    df["hover_y"] = colorir_notas_vetorizado(df["eixo_y"])
     
     # Hover para indicadores individuais
     for col in colunas_x + colunas_y:
         if col in df.columns:
             nova_col = f"hover_{col}"
-            df[nova_col] = df[col].fillna(0).apply(colorir_nota_otimizado)
+            df[nova_col] = colorir_notas_vetorizado(df[col])
             custom_cols.append(nova_col)
     
     return df, custom_cols
@@ -127,6 +223,63 @@ def adicionar_bordas(fig):
     for config in BORDAS_CONFIG:
         fig.add_shape(**config)
 
+@lru_cache(maxsize=1)
+def layout_base_fourbox():
+    """
+    Layout fixo da Matriz Desempenho (quadrantes, bordas, eixos, legenda e margens)
+
+    Validado pelo Plotly uma única vez por processo; grafico_fourbox o aplica com um
+    único update_layout em vez de chamar add_shape/add_annotation a cada render.
+    """
+    quadrantes = [
+        go.layout.Shape(
+            type="rect", x0=x0, x1=x1, y0=y0, y1=y1,
+            fillcolor=CORES_QUADRANTES[nome], opacity=0.2,
+            line=dict(width=0), layer="below"
+        )
+        for x0, x1, y0, y1, nome in QUADRANTES_CONFIG
+    ]
+    rotulos = [
+        go.layout.Annotation(
+            x=(x0 + x1) / 2, y=(y0 + y1) / 2,
+            text=f"<b>{nome}</b>", showarrow=False,
+            font=dict(size=19, color="black"),
+            xanchor="center", yanchor="middle"
+        )
+        for x0, x1, y0, y1, nome in QUADRANTES_CONFIG
+    ]
+    bordas = [go.layout.Shape(**config) for config in BORDAS_CONFIG]
+
+    return go.Layout(
+        shapes=quadrantes + bordas,
+        annotations=rotulos,
+        height=900, width=900,
+        paper_bgcolor='#F3F3F3', plot_bgcolor='#F3F3F3',
+        xaxis=dict(
+            range=[0, 1],
+            tickvals=[],
+            showticklabels=False,
+            title_font=dict(size=16)
+        ),
+        yaxis=dict(
+            range=[0, 1],
+            tickvals=[],
+            showticklabels=False,
+            title_font=dict(size=16)
+        ),
+        legend=dict(
+            title="Tipologia",
+            title_font=dict(size=14),
+            font=dict(size=14),
+            x=-0.02,
+            y=1.0,
+            xanchor='right',
+            bgcolor='rgba(0,0,0,0)'
+        ),
+        showlegend=True,
+        margin=dict(t=70, b=70, l=70, r=70)
+    )
+
 def filtrar_dados_principal(df, empresa_sel, competencia_sel, coluna_periodo):
     """Filtra dados principais de forma otimizada"""
     mask_empresa = df["empresa"] == empresa_sel
@@ -136,13 +289,20 @@ def filtrar_dados_principal(df, empresa_sel, competencia_sel, coluna_periodo):
     else:
         mask_periodo = df[coluna_periodo] == competencia_sel
     
-    return df[mask_empresa & mask_periodo].copy()
+    mask = mask_empresa & mask_periodo
+    # Projeção já filtrada na leitura: cópia rasa (Copy-on-Write, sem copiar dados)
+    return df.copy(deep=False) if mask.all() else df[mask]
 
 def grafico_fourbox(
     df, empresa_sel, competencia_sel, unidade_sel, coluna_periodo,
-    colunas_x_base, pesos_x, colunas_y_base, pesos_y, nome_map, filtro_col
+    colunas_x_base, pesos_x, colunas_y_base, pesos_y, nome_map, filtro_col, cubo=None
 ):
-    """Função principal otimizada para criar o gráfico 4Box"""
+    """
+    Função principal otimizada para criar o gráfico 4Box
+
+    Com cubo (CuboFourbox), as coordenadas vêm de um gather no cubo pré-calculado
+    em vez de serem lidas das colunas de df_filtro.
+    """
 
     # Aplica sufixos corretos
     colunas_x = aplicar_sufixos_colunas(colunas_x_base, filtro_col)
@@ -155,7 +315,12 @@ def grafico_fourbox(
         return px.scatter(title="Sem dados disponíveis")
 
     # Preparações iniciais
-    df_filtro = calcular_eixos_vetorizado(df_filtro, colunas_x, pesos_x, colunas_y, pesos_y)
+    if cubo is not None:
+        eixos = cubo.eixos(df_filtro, empresa_sel, coluna_periodo, colunas_x, pesos_x, colunas_y, pesos_y)
+        df_filtro["eixo_x"] = eixos[:, 0]
+        df_filtro["eixo_y"] = eixos[:, 1]
+    else:
+        df_filtro = calcular_eixos_vetorizado(df_filtro, colunas_x, pesos_x, colunas_y, pesos_y)
     df_filtro["destaque"] = df_filtro["unidade"] == unidade_sel if unidade_sel != "Todas" else False
     df_filtro["idade_unidade"] = pd.to_numeric(df_filtro.get("idade_unidade", 10), errors="coerce").fillna(10)
 
@@ -210,38 +375,8 @@ def grafico_fourbox(
         )
     )
 
-    # Adiciona quadrantes e bordas
-    adicionar_quadrantes(fig)
-    adicionar_bordas(fig)
-
-    # Layout
-    fig.update_layout(
-        height=900, width=900,
-        paper_bgcolor='#F3F3F3', plot_bgcolor='#F3F3F3',
-        xaxis=dict(
-            range=[0, 1],
-            tickvals=[],
-            showticklabels=False,
-            title_font=dict(size=16)
-        ),
-        yaxis=dict(
-            range=[0, 1],
-            tickvals=[],
-            showticklabels=False,
-            title_font=dict(size=16)
-        ),
-        legend=dict(
-            title="Tipologia",
-            title_font=dict(size=14),
-            font=dict(size=14),
-            x=-0.02,
-            y=1.0,
-            xanchor='right',
-            bgcolor='rgba(0,0,0,0)'
-        ),
-        showlegend=True,
-        margin=dict(t=70, b=70, l=70, r=70)
-    )
+    # Quadrantes, bordas e layout fixo (pré-validados e em cache)
+    fig.update_layout(layout_base_fourbox())
 
     # Rodapé explicativo
     fig.add_annotation(
@@ -0,0 +1,166 @@
+"""
+Padronização incremental das notas (colunas *_padronizada).
+
+Mantém, por (empresa, granularidade, período, indicador), o valor de cada unidade
+e as estatísticas do grupo (mínimo, máximo, média e desvio). Ao chegar uma nova
+competência, só os grupos tocados pelas linhas novas são recalculados; as
+colunas padronizadas são emitidas a partir dessas estatísticas.
+
+Métodos:
+    minmax: (x - mínimo) / (máximo - mínimo)
+    zscore: z = (x - média) / desvio, levado a 0–1 com corte em ±LIMITE_Z desvios
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from dados import INDICADORES_BASE
+from filtros import SUFIXO_MAP
+
+# ===== CONSTANTES =====
+METODOS = ["minmax", "zscore"]
+
+LIMITE_Z = 3.0
+
+SEPARADOR_CHAVE = "|"
+
+# Coluna de período -> sufixo da nota bruta (ex.: "ano" -> "_anual")
+SUFIXO_NOTA = {col: sufixo.replace("_padronizada", "") for col, sufixo in SUFIXO_MAP.items()}
+
+
+# ===== ESTATÍSTICAS =====
+class EstatisticasPadronizacao:
+    """
+    População e estatísticas por grupo (empresa, coluna_periodo, periodo, indicador)
+
+    valores guarda a nota de cada unidade no grupo (a última recebida prevalece,
+    como quando o acumulado do trimestre/ano é atualizado por um novo mês);
+    estatisticas guarda mínimo, máximo, média e desvio derivados dela.
+    """
+
+    def __init__(self, metodo="minmax"):
+        if metodo not in METODOS:
+            raise ValueError(f"Método de padronização desconhecido: {metodo}")
+        self.metodo = metodo
+        self.valores = {}
+        self.estatisticas = {}
+
+    def atualizar(self, df):
+        """
+        Incorpora as linhas de df e recalcula apenas os grupos tocados
+
+        Args:
+            df: DataFrame com empresa, unidade, colunas de período e notas brutas
+
+        Returns:
+            set: Chaves (empresa, coluna_periodo, periodo, indicador) cujas estatísticas mudaram
+        """
+        alterados = set()
+        for coluna_periodo, sufixo in SUFIXO_NOTA.items():
+            colunas = [f"{base}{sufixo}" for base in INDICADORES_BASE if f"{base}{sufixo}" in df.columns]
+            if not colunas or coluna_periodo not in df.columns:
+                continue
+            # Nota constante por (empresa, período, unidade): uma observação por unidade
+            ultimas = (
+                df[["empresa", coluna_periodo, "unidade"] + colunas]
+                .astype({"empresa": str, coluna_periodo: str, "unidade": str})
+                .drop_duplicates(["empresa", coluna_periodo, "unidade"], keep="last")
+            )
+            for (empresa, periodo), grupo in ultimas.groupby(["empresa", coluna_periodo], sort=False):
+                for coluna in colunas:
+                    chave = (empresa, coluna_periodo, periodo, coluna)
+                    populacao = self.valores.setdefault(chave, {})
+                    populacao.update(zip(grupo["unidade"], grupo[coluna].astype(float)))
+                    novas = calcular_estatisticas(populacao.values())
+                    if self.estatisticas.get(chave) != novas:
+                        self.estatisticas[chave] = novas
+                        alterados.add(chave)
+        return alterados
+
+    def padronizar(self, df):
+        """Grava em df as colunas *_padronizada das notas com estatísticas conhecidas"""
+        for coluna_periodo, sufixo in SUFIXO_NOTA.items():
+            if coluna_periodo not in df.columns:
+                continue
+            chaves = pd.MultiIndex.from_arrays(
+                [df["empresa"].astype(str), df[coluna_periodo].astype(str)]
+            )
+            for base in INDICADORES_BASE:
+                coluna = f"{base}{sufixo}"
+                if coluna not in df.columns:
+                    continue
+                tabela = pd.DataFrame.from_dict({
+                    (empresa, periodo): est
+                    for (empresa, col, periodo, indicador), est in self.estatisticas.items()
+                    if col == coluna_periodo and indicador == coluna
+                }, orient="index")
+                if tabela.empty:
+                    continue
+                est = tabela.reindex(chaves)
+                df[f"{coluna}_padronizada"] = escalar(
+                    df[coluna].astype(float).to_numpy(), est, self.metodo
+                )
+        return df
+
+    def salvar(self, caminho):
+        dados = {
+            "metodo": self.metodo,
+            "grupos": {
+                SEPARADOR_CHAVE.join(chave): {"valores": populacao, "estatisticas": self.estatisticas[chave]}
+                for chave, populacao in self.valores.items()
+            }
+        }
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with open(caminho, encoding="utf-8") as f:
+            dados = json.load(f)
+        estatisticas = cls(dados["metodo"])
+        for chave, grupo in dados["grupos"].items():
+            chave = tuple(chave.split(SEPARADOR_CHAVE))
+            estatisticas.valores[chave] = grupo["valores"]
+            estatisticas.estatisticas[chave] = grupo["estatisticas"]
+        return estatisticas
+
+
+# ===== FUNÇÕES UTILITÁRIAS =====
+def calcular_estatisticas(valores):
+    """Mínimo, máximo, média e desvio (populacional) de uma população de notas"""
+    valores = np.fromiter(valores, dtype=float)
+    valores = valores[np.isfinite(valores)]
+    if not len(valores):
+        return {"minimo": None, "maximo": None, "media": None, "desvio": None}
+    return {
+        "minimo": float(valores.min()), "maximo": float(valores.max()),
+        "media": float(valores.mean()), "desvio": float(valores.std())
+    }
+
+def escalar(x, est, metodo):
+    """Leva x para 0–1 com as estatísticas do grupo de cada linha (0 sem estatística ou amplitude)"""
+    if metodo == "minmax":
+        inicio = est["minimo"].to_numpy(dtype=float)
+        amplitude = est["maximo"].to_numpy(dtype=float) - inicio
+    else:
+        desvio = est["desvio"].to_numpy(dtype=float)
+        inicio = est["media"].to_numpy(dtype=float) - LIMITE_Z * desvio
+        amplitude = 2 * LIMITE_Z * desvio
+    with np.errstate(divide="ignore", invalid="ignore"):
+        escala = np.clip((x - inicio) / amplitude, 0, 1)
+    return np.where(np.isfinite(escala) & (amplitude > 0), escala, 0.0)
+
+def competencias_afetadas(chaves, competencias):
+    """
+    (empresa, competencia) das linhas que pertencem aos grupos alterados
+
+    Args:
+        chaves: Saída de EstatisticasPadronizacao.atualizar
+        competencias: DataFrame com 'competencia' e as colunas de período correspondentes
+    """
+    afetadas = set()
+    for empresa, coluna_periodo, periodo, _ in chaves:
+        mascara = competencias[coluna_periodo].astype(str) == periodo
+        afetadas.update((empresa, c) for c in competencias.loc[mascara, "competencia"].astype(str))
+    return afetadas
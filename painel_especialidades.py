@@ -1,7 +1,14 @@
+from functools import lru_cache
+
 import streamlit as st
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+import numpy as np
 import pandas as pd
 
+from dados import HASH_DADOS
+from periodos import garantir_chaves_periodo
+
 # ===== CONSTANTES =====
 ESPECIALIDADES = [
     "Odontologia", "Fisioterapia", "Psicologia", "Nutrição", 
@@ -21,6 +28,15 @@ MAPA_COLUNAS = {
     "Palestra SENAT": "pale_senat"
 }
 
+# Empresa dona de cada especialidade (as demais linhas não entram na soma)
+EMPRESA_ESPECIALIDADE = {
+    "odonto": "SEST", "fisio": "SEST", "psico": "SEST",
+    "nutri": "SEST", "pale_sest": "SEST", "elc": "SEST",
+    "curso_prese": "SENAT", "curso_ead": "SENAT", "pale_senat": "SENAT"
+}
+
+COLUNAS_ESPECIALIDADES = [MAPA_COLUNAS[nome] for nome in ESPECIALIDADES]
+
 CORES_PERFORMANCE = {
     "bom": "#588157",
     "ruim": "#b04c52", 
@@ -37,40 +53,31 @@ CONFIGURACAO_DONUT = {
     "plot_bgcolor": "#a5b8bd"
 }
 
+# Donuts em uma única figura (grade de subplots) em vez de um gráfico por especialidade
+DONUTS_EM_LOTE = True
+
+COLUNAS_GRADE_DONUT = 3
+
 # ===== FUNÇÕES UTILITÁRIAS =====
-@st.cache_data
 def processar_dados_temporais_especialidades(df):
-    """Processa dados temporais com cache"""
-    df = df.copy()
-    df["ano"] = df["competencia"].str[:4]
-    df["mes"] = df["competencia"].str[5:7].astype(int)
-    df["semestre"] = (df["mes"] > 6).astype(int) + 1
-    df["trimestre_mes"] = ((df["mes"] - 1) // 3 + 1).astype(str)
-    df["trimestre"] = df["ano"] + "-" + df["trimestre_mes"]
-    df["ano_semestre"] = df["ano"] + "-" + df["semestre"].astype(str)
-    return df
+    """Chaves de período vêm prontas do parquet preparado (ver periodos.py)"""
+    return garantir_chaves_periodo(df)
 
-def calcular_metricas_especialidade(linha, especialidade_nome):
-    """Calcula métricas para uma especialidade específica"""
-    especialidade_col = MAPA_COLUNAS[especialidade_nome]
-    
-    valor_real = int(linha.get(especialidade_col, 0))
-    valor_meta = int(linha.get(f"meta_{especialidade_col}", 0))
-    delta = valor_real - valor_meta
+def calcular_metricas_especialidade(metricas):
+    """Completa as métricas de uma especialidade (linha de tabela_especialidades) para o card"""
+    delta = int(metricas["delta"])
     
     simbolo = "↑" if delta >= 0 else "↓"
     cor = CORES_PERFORMANCE["bom"] if delta >= 0 else CORES_PERFORMANCE["ruim"]
     texto_delta = f"<span style='color:{cor}; font-size:16px;'>{simbolo} {abs(delta):,}".replace(",", ".") + "</span>"
     
-    valor_pct = linha.get(f"pct_{especialidade_col}")
-    try:
-        valor_pct = float(valor_pct) if valor_pct is not None else None
-    except (ValueError, TypeError):
-        valor_pct = None
+    # pct ausente ou não numérico: sem donut
+    valor_pct = metricas["valor_pct"]
+    valor_pct = None if pd.isna(valor_pct) else float(valor_pct)
     
     return {
-        'valor_real': valor_real,
-        'valor_meta': valor_meta,
+        'valor_real': int(metricas["valor_real"]),
+        'valor_meta': int(metricas["valor_meta"]),
         'delta': delta,
         'texto_delta': texto_delta,
         'valor_pct': valor_pct,
@@ -109,6 +116,74 @@ def criar_donut_chart(valor_pct):
     
     return fig
 
+@lru_cache(maxsize=4)
+def grade_donuts(especialidades, colunas=COLUNAS_GRADE_DONUT):
+    """
+    Esqueleto da grade de donuts montado uma vez com make_subplots (células 'domain')
+
+    Returns:
+        tuple: (anotações dos títulos, domínios (x, y) de cada célula na ordem das especialidades)
+    """
+    linhas = -(-len(especialidades) // colunas)
+    fig = make_subplots(
+        rows=linhas, cols=colunas,
+        specs=[[{"type": "domain"}] * colunas for _ in range(linhas)],
+        subplot_titles=[nome.upper() for nome in especialidades],
+        horizontal_spacing=0.04, vertical_spacing=0.08
+    )
+    titulos = tuple(anotacao.to_plotly_json() for anotacao in fig.layout.annotations)
+    dominios = tuple(
+        (tuple(dominio.x), tuple(dominio.y))
+        for dominio in (fig.get_subplot(i // colunas + 1, i % colunas + 1) for i in range(len(especialidades)))
+    )
+    return titulos, dominios
+
+def criar_donuts_em_lote(especialidades, valores_pct, colunas=COLUNAS_GRADE_DONUT):
+    """
+    Donuts de todas as especialidades em uma única figura (grade de subplots 'domain')
+
+    Uma serialização e um componente no navegador por rerun, no lugar de um por
+    especialidade; especialidades sem pct ficam com a célula vazia. A grade vem em
+    cache (grade_donuts): a cada rerun só os traços e os percentuais são montados.
+    """
+    titulos, dominios = grade_donuts(tuple(especialidades), colunas)
+    
+    tracos, anotacoes = [], list(titulos)
+    for valor_pct, (x, y) in zip(valores_pct, dominios):
+        if valor_pct is None:
+            continue
+        valor_plotado = min(valor_pct, 100)
+        cor_donut = CORES_PERFORMANCE["donut_bom"] if valor_pct >= 100 else CORES_PERFORMANCE["donut_ruim"]
+        tracos.append(go.Pie(
+            values=[valor_plotado, 100 - valor_plotado],
+            hole=0.65,
+            domain=dict(x=x, y=y),
+            marker=dict(
+                colors=[cor_donut, CORES_PERFORMANCE["neutro"]],
+                line=dict(color="black", width=2)
+            ),
+            textinfo='none',
+            showlegend=False
+        ))
+        anotacoes.append(dict(
+            text=f"{valor_pct:.0f}%",
+            x=sum(x) / 2, y=sum(y) / 2,
+            xref="paper", yref="paper",
+            font_size=24,
+            showarrow=False,
+            font_color=cor_donut
+        ))
+    
+    linhas = -(-len(especialidades) // colunas)
+    layout = go.Layout(
+        margin=CONFIGURACAO_DONUT["margin"] | dict(t=40),
+        height=CONFIGURACAO_DONUT["height"] * linhas,
+        paper_bgcolor=CONFIGURACAO_DONUT["paper_bgcolor"],
+        plot_bgcolor=CONFIGURACAO_DONUT["plot_bgcolor"],
+        annotations=anotacoes
+    )
+    return go.Figure(data=tracos, layout=layout)
+
 def agregar_dados_periodo(df_unidade):
     """Agrega dados quando há múltiplas linhas para o mesmo período"""
     if len(df_unidade) <= 1:
@@ -148,6 +223,93 @@ def agregar_dados_periodo(df_unidade):
     
     return agregados
 
+@st.cache_data(hash_funcs=HASH_DADOS, show_spinner=False)
+def tabela_especialidades(dados, coluna_periodo):
+    """
+    Realizado, meta, delta e % de todas as especialidades, unidades e períodos
+
+    O bloco largo (linhas × especialidades) é empilhado em formato longo e agregado em
+    um único groupby por (unidade, período, especialidade), com a mesma regra de
+    agregar_dados_periodo: grupo de uma linha usa os valores e o pct gravados; com
+    várias linhas, soma só as linhas da empresa dona da especialidade e recalcula o pct.
+
+    Args:
+        dados: IndiceDados da aba Atendimentos
+        coluna_periodo: Coluna de período (competencia, trimestre, ano_semestre, ano)
+
+    Returns:
+        DataFrame: Índice (unidade, período, especialidade), especialidades na ordem de
+        ESPECIALIDADES; colunas valor_real, valor_meta, delta e valor_pct
+    """
+    df = dados.df
+    n_especialidades = len(COLUNAS_ESPECIALIDADES)
+    
+    real = df[COLUNAS_ESPECIALIDADES].to_numpy(dtype=float)
+    meta = df[[f"meta_{col}" for col in COLUNAS_ESPECIALIDADES]].to_numpy(dtype=float)
+    pct = (
+        df[[f"pct_{col}" for col in COLUNAS_ESPECIALIDADES]]
+        .apply(pd.to_numeric, errors="coerce")
+        .to_numpy(dtype=float)
+    )
+    if "empresa" in df.columns:
+        donas = np.array([EMPRESA_ESPECIALIDADE[col] for col in COLUNAS_ESPECIALIDADES])
+        propria = df["empresa"].astype(str).to_numpy()[:, None] == donas[None, :]
+    else:
+        propria = np.ones(real.shape, dtype=bool)
+    
+    # Formato longo: uma linha por (linha original, especialidade)
+    longo = pd.DataFrame({
+        "unidade": df["unidade"].repeat(n_especialidades).to_numpy(),
+        coluna_periodo: df[coluna_periodo].astype(str).repeat(n_especialidades).to_numpy(),
+        "especialidade": pd.Categorical.from_codes(
+            np.tile(np.arange(n_especialidades), len(df)), ESPECIALIDADES
+        ),
+        "real": real.ravel(),
+        "meta": meta.ravel(),
+        "pct": pct.ravel(),
+        "real_propria": np.where(propria, real, 0).ravel(),
+        "meta_propria": np.where(propria, meta, 0).ravel(),
+    })
+    grupos = longo.groupby(["unidade", coluna_periodo, "especialidade"], observed=True, sort=True).agg(
+        linhas=("real", "size"),
+        real=("real", "first"), meta=("meta", "first"), pct=("pct", "first"),
+        soma_real=("real_propria", "sum"), soma_meta=("meta_propria", "sum"),
+    )
+    
+    # Somas de volta ao bloco largo, no tipo das colunas de origem em ponto flutuante (ex.:
+    # pale_senat em float32), para que realizado e pct arredondem como a soma coluna a
+    # coluna; contagens inteiras (compactadas em uint8/uint16) ficam nas somas em float64
+    tipos = {
+        col: tipo for col, tipo in zip(COLUNAS_ESPECIALIDADES, df[COLUNAS_ESPECIALIDADES].dtypes)
+        if tipo.kind == "f"
+    }
+    largo_real = pd.DataFrame(
+        grupos["soma_real"].to_numpy().reshape(-1, n_especialidades), columns=COLUNAS_ESPECIALIDADES
+    ).astype(tipos)
+    soma_meta = grupos["soma_meta"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_agregado = (100 * largo_real / soma_meta.reshape(-1, n_especialidades)).to_numpy(dtype=float).ravel()
+    soma_real = largo_real.to_numpy(dtype=float).ravel()
+    pct_agregado = np.where(soma_meta > 0, pct_agregado, 0.0)
+    
+    unica = grupos["linhas"].to_numpy() == 1
+    
+    valor_real = np.where(unica, grupos["real"], soma_real).astype(np.int64)
+    valor_meta = np.where(unica, grupos["meta"], soma_meta).astype(np.int64)
+    return pd.DataFrame({
+        "valor_real": valor_real,
+        "valor_meta": valor_meta,
+        "delta": valor_real - valor_meta,
+        "valor_pct": np.where(unica, grupos["pct"], pct_agregado),
+    }, index=grupos.index)
+
+def metricas_unidade(tabela, unidade_sel, valor_periodo):
+    """Linhas de tabela_especialidades da unidade/período (None se não houver)"""
+    try:
+        return tabela.loc[(unidade_sel, str(valor_periodo))]
+    except KeyError:
+        return None
+
 def criar_card_especialidade(especialidade_nome, metricas, indice):
     """Cria card HTML para uma especialidade"""
     return f"""
@@ -162,44 +324,39 @@ def criar_card_especialidade(especialidade_nome, metricas, indice):
     """
 
 # ===== FUNÇÃO PRINCIPAL =====
-def exibir_metricas_com_donut(df, unidade_sel, coluna_periodo, valor_periodo):
+def exibir_metricas_com_donut(dados, unidade_sel, coluna_periodo, valor_periodo):
     """
     Exibe métricas das especialidades com gráficos donut de forma otimizada
     
     Args:
-        df: DataFrame com os dados
+        dados: IndiceDados da aba (DataFrame + índice de linhas)
         unidade_sel: Unidade selecionada
         coluna_periodo: Coluna que representa o período (competencia, trimestre, etc.)
         valor_periodo: Valor do período selecionado
     """
     
-    # Processamento temporal com cache
-    df = processar_dados_temporais_especialidades(df)
-    
-    # Filtro principal otimizado
-    mask = (df["unidade"] == unidade_sel) & (df[coluna_periodo] == valor_periodo)
-    df_unidade = df[mask].copy()
+    # Métricas da unidade/período na tabela em cache (ambas as empresas)
+    tabela = metricas_unidade(tabela_especialidades(dados, coluna_periodo), unidade_sel, valor_periodo)
     
-    if df_unidade.empty:
+    if tabela is None:
         st.warning("Unidade não encontrada para o período selecionado.")
         return
     
-    # Agregação de dados se necessário
-    linha = agregar_dados_periodo(df_unidade)
+    metricas_especialidades = [
+        calcular_metricas_especialidade(tabela.loc[especialidade_nome])
+        for especialidade_nome in ESPECIALIDADES
+    ]
     
     # Criação das colunas para layout responsivo
-    colunas = st.columns(3)
+    colunas = st.columns(COLUNAS_GRADE_DONUT)
     
     # Processamento otimizado de cada especialidade
-    for i, especialidade_nome in enumerate(ESPECIALIDADES):
-        # Cálculo das métricas
-        metricas = calcular_metricas_especialidade(linha, especialidade_nome)
-        
-        # Criação do gráfico donut
-        fig = criar_donut_chart(metricas['valor_pct'])
+    for i, (especialidade_nome, metricas) in enumerate(zip(ESPECIALIDADES, metricas_especialidades)):
+        # Criação do gráfico donut (no modo em lote, todos vão em uma figura abaixo dos cards)
+        fig = None if DONUTS_EM_LOTE else criar_donut_chart(metricas['valor_pct'])
         
         # Renderização do card e gráfico
-        with colunas[i % 3]:
+        with colunas[i % COLUNAS_GRADE_DONUT]:
             # Card com informações
             card_html = criar_card_especialidade(especialidade_nome, metricas, i)
             st.markdown(card_html, unsafe_allow_html=True)
@@ -215,61 +372,38 @@ def exibir_metricas_com_donut(df, unidade_sel, coluna_periodo, valor_periodo):
             
             # Fechamento da div do card
             st.markdown("</div>", unsafe_allow_html=True)
+    
+    if DONUTS_EM_LOTE:
+        st.plotly_chart(
+            criar_donuts_em_lote(ESPECIALIDADES, [m['valor_pct'] for m in metricas_especialidades]),
+            use_container_width=True,
+            config={"displayModeBar": False},
+            key=f"donuts_{valor_periodo}"
+        )
 
 # ===== FUNÇÕES AUXILIARES PARA ANÁLISE =====
-@st.cache_data
-def calcular_resumo_performance(df, unidade_sel, coluna_periodo, valor_periodo):
+@st.cache_data(hash_funcs=HASH_DADOS)
+def calcular_resumo_performance(dados, unidade_sel, coluna_periodo, valor_periodo):
     """Calcula resumo de performance para análise"""
-    df = processar_dados_temporais_especialidades(df)
-    
-    mask = (df["unidade"] == unidade_sel) & (df[coluna_periodo] == valor_periodo)
-    df_unidade = df[mask].copy()
+    tabela = metricas_unidade(tabela_especialidades(dados, coluna_periodo), unidade_sel, valor_periodo)
     
-    if df_unidade.empty:
+    if tabela is None:
         return None
     
-    linha = agregar_dados_periodo(df_unidade)
+    performances = tabela["valor_pct"].fillna(0)
+    melhor, pior = performances.idxmax(), performances.idxmin()
     
-    resumo = {
-        'especialidades_acima_meta': 0,
-        'especialidades_abaixo_meta': 0,
-        'performance_media': 0,
-        'melhor_performance': ('', 0),
-        'pior_performance': ('', 100)
+    return {
+        'especialidades_acima_meta': int((performances >= 100).sum()),
+        'especialidades_abaixo_meta': int((performances < 100).sum()),
+        'performance_media': float(performances.mean()),
+        'melhor_performance': (melhor, float(performances[melhor])) if performances[melhor] > 0 else ('', 0),
+        'pior_performance': (pior, float(performances[pior])) if performances[pior] < 100 else ('', 100)
     }
-    
-    performances = []
-    
-    for esp_nome in ESPECIALIDADES:
-        esp_col = MAPA_COLUNAS[esp_nome]
-        valor_pct = linha.get(f"pct_{esp_col}", 0)
-        try:
-            valor_pct = float(valor_pct) if valor_pct is not None else 0
-        except (ValueError, TypeError):
-            valor_pct = 0
-        
-        performances.append(valor_pct)
-        
-        if valor_pct >= 100:
-            resumo['especialidades_acima_meta'] += 1
-        else:
-            resumo['especialidades_abaixo_meta'] += 1
-        
-        # Melhor performance
-        if valor_pct > resumo['melhor_performance'][1]:
-            resumo['melhor_performance'] = (esp_nome, valor_pct)
-        
-        # Pior performance
-        if valor_pct < resumo['pior_performance'][1]:
-            resumo['pior_performance'] = (esp_nome, valor_pct)
-    
-    resumo['performance_media'] = sum(performances) / len(performances) if performances else 0
-    
-    return resumo
 
-def exibir_resumo_performance(df, unidade_sel, coluna_periodo, valor_periodo):
+def exibir_resumo_performance(dados, unidade_sel, coluna_periodo, valor_periodo):
     """Exibe resumo da performance das especialidades"""
-    resumo = calcular_resumo_performance(df, unidade_sel, coluna_periodo, valor_periodo)
+    resumo = calcular_resumo_performance(dados, unidade_sel, coluna_periodo, valor_periodo)
     
     if not resumo:
         return
@@ -305,59 +439,81 @@ def exibir_resumo_performance(df, unidade_sel, coluna_periodo, valor_periodo):
         )
 
 # ===== FUNÇÃO PARA COMPARAÇÃO TEMPORAL =====
-def comparar_performance_temporal(df, unidade_sel, coluna_periodo):
-    """Compara performance entre diferentes períodos"""
-    df = processar_dados_temporais_especialidades(df)
+@st.cache_data(hash_funcs=HASH_DADOS, show_spinner=False)
+def calcular_performance_temporal(dados, coluna_periodo, unidades=None, n_periodos=6):
+    """
+    Performance média (média do % das especialidades) por unidade e período
+    
+    Um único groupby por (unidade, período) sobre tabela_especialidades cobre todas
+    as unidades e períodos de uma vez; pct ausente conta como 0.
+    
+    Args:
+        dados: IndiceDados da aba Atendimentos
+        coluna_periodo: Coluna de período (competencia, trimestre, ano_semestre, ano)
+        unidades: Unidades desejadas (None = todas)
+        n_periodos: Últimos N períodos de cada unidade (None = histórico completo)
+    
+    Returns:
+        DataFrame: unidade, periodo e performance_media, em ordem de unidade e período
+    """
+    media = (
+        tabela_especialidades(dados, coluna_periodo)["valor_pct"]
+        .fillna(0)
+        .groupby(level=["unidade", coluna_periodo], sort=True)
+        .mean()
+    )
+    if unidades is not None:
+        media = media[media.index.get_level_values("unidade").isin(unidades)]
+    if n_periodos:
+        media = media.groupby(level="unidade", sort=False).tail(n_periodos)
+    
+    return (
+        media.rename("performance_media")
+        .reset_index()
+        .rename(columns={coluna_periodo: "periodo"})
+    )
+
+def comparar_performance_temporal(dados, unidades, coluna_periodo, n_periodos=6):
+    """
+    Compara a performance média entre períodos para uma ou mais unidades
+    
+    Args:
+        dados: IndiceDados da aba Atendimentos
+        unidades: Unidade ou lista de unidades (uma linha por unidade)
+        coluna_periodo: Coluna que representa o período (competencia, trimestre, etc.)
+        n_periodos: Últimos N períodos de cada unidade (None = histórico completo)
+    """
+    if isinstance(unidades, str):
+        unidades = [unidades]
     
-    periodos_disponiveis = sorted(df[df["unidade"] == unidade_sel][coluna_periodo].unique())
+    df_comparacao = calcular_performance_temporal(dados, coluna_periodo, list(unidades), n_periodos)
     
-    if len(periodos_disponiveis) < 2:
+    if df_comparacao["periodo"].nunique() < 2:
         st.info("Necessário pelo menos 2 períodos para comparação temporal.")
         return
     
-    dados_comparacao = []
+    import plotly.express as px
     
-    for periodo in periodos_disponiveis[-6:]:  # Últimos 6 períodos
-        mask = (df["unidade"] == unidade_sel) & (df[coluna_periodo] == periodo)
-        df_periodo = df[mask].copy()
-        
-        if not df_periodo.empty:
-            linha = agregar_dados_periodo(df_periodo)
-            
-            performance_total = []
-            for esp_nome in ESPECIALIDADES:
-                esp_col = MAPA_COLUNAS[esp_nome]
-                valor_pct = linha.get(f"pct_{esp_col}", 0)
-                try:
-                    valor_pct = float(valor_pct) if valor_pct is not None else 0
-                except (ValueError, TypeError):
-                    valor_pct = 0
-                performance_total.append(valor_pct)
-            
-            dados_comparacao.append({
-                'periodo': periodo,
-                'performance_media': sum(performance_total) / len(performance_total) if performance_total else 0
-            })
-    
-    if dados_comparacao:
-        import plotly.express as px
-        df_comparacao = pd.DataFrame(dados_comparacao)
-        
-        fig = px.line(
-            df_comparacao,
-            x='periodo',
-            y='performance_media',
-            title=f'Evolução da Performance Média - {unidade_sel}',
-            markers=True
-        )
-        
-        fig.add_hline(y=100, line_dash="dash", line_color="red", 
-                     annotation_text="Meta (100%)")
-        
-        fig.update_layout(
-            xaxis_title="Período",
-            yaxis_title="Performance Média (%)",
-            height=400
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    titulo = (
+        f'Evolução da Performance Média - {unidades[0]}' if len(unidades) == 1
+        else 'Evolução da Performance Média'
+    )
+    fig = px.line(
+        df_comparacao,
+        x='periodo',
+        y='performance_media',
+        color='unidade' if len(unidades) > 1 else None,
+        title=titulo,
+        markers=True
+    )
+    
+    fig.add_hline(y=100, line_dash="dash", line_color="red", 
+                 annotation_text="Meta (100%)")
+    
+    fig.update_layout(
+        xaxis_title="Período",
+        yaxis_title="Performance Média (%)",
+        height=400
+    )
+    
+    st.plotly_chart(fig, use_container_width=True)
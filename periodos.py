@@ -0,0 +1,75 @@
+import pandas as pd
+
+# ===== CONSTANTES =====
+# Incrementar sempre que a derivação das chaves de período mudar
+VERSAO_PERIODOS = 1
+
+# Chave gravada nos metadados do parquet preparado
+CHAVE_METADADOS = b"versao_periodos"
+
+COLUNAS_PERIODO = ["ano", "mes", "semestre", "trimestre", "ano_semestre"]
+
+# Mapeamento de "Agrupar por" para a coluna de período
+COLUNA_PERIODO_MAP = {
+    "Mês": "competencia",
+    "Semestre": "ano_semestre",
+    "Ano": "ano",
+    "Trimestre": "trimestre"
+}
+
+
+# ===== DERIVAÇÃO =====
+def derivar_chaves_periodo(competencia):
+    """
+    Deriva as chaves de período a partir de uma série de competências ('AAAA-MM')
+
+    O parsing de texto é feito apenas sobre as competências distintas; as linhas
+    recebem os códigos. ano/trimestre/ano_semestre saem como categóricas e
+    mes/semestre como int8.
+
+    Args:
+        competencia: Series com as competências
+
+    Returns:
+        DataFrame: Colunas de COLUNAS_PERIODO alinhadas ao índice da série
+    """
+    categorias = competencia.astype(str).astype("category")
+    codigos = categorias.cat.codes.to_numpy()
+    distintas = pd.Series(categorias.cat.categories.astype(str))
+
+    ano = distintas.str[:4]
+    mes = distintas.str[5:7].astype("int8")
+    semestre = ((mes > 6).astype("int8") + 1).astype("int8")
+    trimestre = ano + "-" + ((mes - 1) // 3 + 1).astype(str)
+    ano_semestre = ano + "-" + semestre.astype(str)
+
+    def por_linha_categorica(valores):
+        cats = pd.Categorical(valores)
+        return pd.Categorical.from_codes(cats.codes[codigos], categories=cats.categories)
+
+    return pd.DataFrame({
+        "ano": por_linha_categorica(ano),
+        "mes": mes.to_numpy()[codigos],
+        "semestre": semestre.to_numpy()[codigos],
+        "trimestre": por_linha_categorica(trimestre),
+        "ano_semestre": por_linha_categorica(ano_semestre),
+    }, index=competencia.index)
+
+def aplicar_chaves_periodo(df):
+    """Grava (ou sobrescreve) as chaves de período no DataFrame"""
+    chaves = derivar_chaves_periodo(df["competencia"])
+    for col in COLUNAS_PERIODO:
+        df[col] = chaves[col]
+    return df
+
+def garantir_chaves_periodo(df):
+    """Deriva as chaves de período apenas quando o DataFrame ainda não as possui"""
+    if all(col in df.columns for col in COLUNAS_PERIODO):
+        return df
+    return aplicar_chaves_periodo(df)
+
+def versao_periodos_do_schema(schema):
+    """Lê a versão das chaves de período gravada no schema de um parquet (None se ausente)"""
+    metadados = schema.metadata or {}
+    versao = metadados.get(CHAVE_METADADOS)
+    return int(versao) if versao is not None else None
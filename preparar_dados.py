@@ -0,0 +1,78 @@
+"""
+Preparação offline do parquet de indicadores.
+
+Grava uma cópia do parquet bruto já renomeada, ordenada por competência, com as
+chaves de período (ano, mes, semestre, trimestre, ano_semestre) materializadas e
+as dimensões dicionarizadas, para que a aplicação não faça parsing de texto na
+inicialização.
+
+Uso:
+    python preparar_dados.py [origem] [destino] [--relatorio-memoria] [--relatorio-esquema]
+"""
+import argparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dados import (
+    ARQUIVO_DADOS, ARQUIVO_ORIGEM, RENOMEAR_COLUNAS,
+    converter_categoricas, relatorio_esquema, relatorio_memoria
+)
+from periodos import CHAVE_METADADOS, VERSAO_PERIODOS, aplicar_chaves_periodo
+
+
+def preparar_dataframe(df):
+    """Renomeia, deriva as chaves de período, dicionariza as dimensões e ordena por competência"""
+    df.rename(columns=RENOMEAR_COLUNAS, inplace=True)
+    df["competencia"] = df["competencia"].astype(str)
+    df = aplicar_chaves_periodo(df)
+    df = converter_categoricas(df)
+    df.sort_values(by="competencia", kind="stable", inplace=True)
+    return df
+
+def preparar_dados(origem=ARQUIVO_ORIGEM, destino=ARQUIVO_DADOS):
+    """Lê o parquet bruto, deriva as chaves de período e grava o parquet preparado"""
+    df = preparar_dataframe(pd.read_parquet(origem))
+
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    metadados = dict(tabela.schema.metadata or {})
+    metadados[CHAVE_METADADOS] = str(VERSAO_PERIODOS).encode()
+    pq.write_table(tabela.replace_schema_metadata(metadados), destino)
+    return tabela.num_rows
+
+
+def imprimir_relatorio_memoria(origem, destino):
+    """Compara a memória do DataFrame bruto com a do parquet preparado"""
+    antes = relatorio_memoria(pd.read_parquet(origem))
+    depois = relatorio_memoria(pd.read_parquet(destino))
+    print(f"Memória antes:  {antes['MB'].sum():.2f} MB ({origem})")
+    print(f"Memória depois: {depois['MB'].sum():.2f} MB ({destino})")
+    print("Maiores colunas (depois):")
+    print(depois.head(10).to_string(index=False, float_format="{:.3f}".format))
+
+def imprimir_relatorio_esquema(origem):
+    """Valida as colunas monetárias do parquet de origem (tipos, nulos e valores inválidos)"""
+    relatorio = relatorio_esquema(pq.read_table(origem))
+    print(f"Esquema das colunas monetárias ({origem}):")
+    print(relatorio.to_string(index=False))
+    if relatorio["invalidas"].any():
+        print("⚠️ Valores inválidos serão lidos como 0 pela aplicação")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepara o parquet de indicadores")
+    parser.add_argument("origem", nargs="?", default=ARQUIVO_ORIGEM)
+    parser.add_argument("destino", nargs="?", default=ARQUIVO_DADOS)
+    parser.add_argument("--relatorio-memoria", action="store_true",
+                        help="imprime a memória antes/depois da preparação")
+    parser.add_argument("--relatorio-esquema", action="store_true",
+                        help="valida as colunas monetárias da origem")
+    args = parser.parse_args()
+
+    linhas = preparar_dados(args.origem, args.destino)
+    print(f"✅ {linhas} linhas gravadas em {args.destino} (períodos v{VERSAO_PERIODOS})")
+    if args.relatorio_memoria:
+        imprimir_relatorio_memoria(args.origem, args.destino)
+    if args.relatorio_esquema:
+        imprimir_relatorio_esquema(args.origem)
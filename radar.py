@@ -1,53 +1,140 @@
 import plotly.express as px
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
+from functools import lru_cache
+from plotly.subplots import make_subplots
 
+from dados import HASH_DADOS
+from matriz_desempenho import NOTA_NA_HTML
 
+# ===== CONSTANTES =====
+EMPRESAS_RADAR = ["SEST", "SENAT"]
 
-def grafico_radar_notas(df, empresa_sel, unidade_sel, competencia_sel, agrupamento_opcao):
-    """Gráfico radar com valores padronizados - SEST vs SENAT"""
-    
+COLUNA_PERIODO_RADAR = {
+    "Mês": "competencia",
+    "Trimestre": "trimestre",
+    "Semestre": "ano_semestre",
+    "Ano": "ano",
+}
+
+SUFIXO_RADAR = {
+    "Mês": "_mensal",
+    "Trimestre": "_trimestral",
+    "Semestre": "_semestral",
+    "Ano": "_anual",
+}
+
+# Eixos do radar/cards: (indicador base, rótulo, chave do % de execução)
+INDICADORES_RADAR = [
+    ("custo", "💸 Custo", "custo"),
+    ("producao", "🥼 Produção", "producao"),
+    ("caixa", "💰 Equilíbrio Financeiro", "caixa"),
+    ("orcamento", "📊 Orçamento", "orcamento"),
+    ("receita_operacional", "📈 Receita Operacional", "receita"),
+]
+
+# % de execução: chave -> (realizado, previsto), somados no período
+RAZOES_EXECUCAO = {
+    "custo": ("soma_custo_realizado", "soma_meta"),
+    "orcamento": ("despesa_liquidada", "despesa_prevista"),
+    "caixa": ("receitas", "despesas"),
+    "receita": ("receita_realizada", "receita_prevista"),
+}
+
+# % de execução: chave -> nota média no período (0–1)
+MEDIAS_EXECUCAO = {"nps": "nota_nps", "producao": "nota_producao"}
+
+# Modos da aba: SEST x SENAT de uma unidade, ou várias unidades (conselho/tipologia)
+MODOS_RADAR = ["SEST x SENAT", "Unidades sobrepostas", "Unidades em mosaico"]
+
+RADAR_MOSAICO_COLUNAS = 4
+
+RADAR_MOSAICO_MAX = 48
+
+ALTURA_CELULA_MOSAICO = 260
+
+
+# ===== MOTOR DO RADAR =====
+@st.cache_data(hash_funcs=HASH_DADOS, show_spinner=False)
+def calcular_radar(dados, unidade_sel, competencia_sel, agrupamento_opcao):
+    """
+    Valores padronizados e % de execução de SEST e SENAT em uma única passada
+
+    Um groupby por empresa sobre a fatia do período/unidade produz as duas empresas
+    de uma vez; gráfico e cards leem o mesmo resultado (em cache no handle dos dados).
+    Em períodos com várias linhas, as notas padronizadas são a média e os valores de
+    execução vêm das somas do período. As médias ignoram nulos; um indicador sem
+    nenhum valor no período fica NaN em execucao (o card mostra N/A) e 0 em padronizados.
+
+    Returns:
+        tuple: (padronizados, execucao), DataFrames indexados pelas empresas com dados;
+        padronizados tem uma coluna por indicador base de INDICADORES_RADAR e execucao
+        as chaves de RAZOES_EXECUCAO e MEDIAS_EXECUCAO
+    """
+    coluna_periodo = COLUNA_PERIODO_RADAR[agrupamento_opcao]
+    sufixo = SUFIXO_RADAR[agrupamento_opcao]
+    df = dados.fatia(
+        None, coluna_periodo, competencia_sel,
+        unidade_sel if unidade_sel != "Todas" else None
+    )
     
+    colunas_padronizadas = [f"nota_{base}{sufixo}_padronizada" for base, _, _ in INDICADORES_RADAR]
+    colunas_soma = [col for par in RAZOES_EXECUCAO.values() for col in par]
+    colunas = [col for col in colunas_padronizadas if col in df.columns] + list(MEDIAS_EXECUCAO.values()) + colunas_soma
+    
+    # Soma e contagem (sem NaN) de cada coluna por empresa, em uma passada sobre o bloco
+    codigos = pd.Index(EMPRESAS_RADAR).get_indexer(df["empresa"].astype(str))
+    bloco = df[colunas].to_numpy(dtype=float)[codigos >= 0]
+    codigos = codigos[codigos >= 0]
+    validos = ~np.isnan(bloco)
+    somas = np.zeros((len(EMPRESAS_RADAR), len(colunas)))
+    contagens = np.zeros((len(EMPRESAS_RADAR), len(colunas)))
+    np.add.at(somas, codigos, np.where(validos, bloco, 0.0))
+    np.add.at(contagens, codigos, validos)
+    
+    com_dados = np.bincount(codigos, minlength=len(EMPRESAS_RADAR)) > 0
+    empresas = [empresa for empresa, tem in zip(EMPRESAS_RADAR, com_dados) if tem]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        somas = pd.DataFrame(somas[com_dados], index=empresas, columns=colunas)
+        medias = somas / contagens[com_dados]
+        
+        padronizados = pd.DataFrame({
+            base: medias[col] if col in medias.columns else 0.0
+            for (base, _, _), col in zip(INDICADORES_RADAR, colunas_padronizadas)
+        }, index=empresas).fillna(0)
+        
+        execucao = pd.DataFrame({
+            chave: np.where(somas[previsto] > 0, somas[realizado] / somas[previsto] * 100, 0.0)
+            for chave, (realizado, previsto) in RAZOES_EXECUCAO.items()
+        } | {
+            chave: medias[coluna] * 100 for chave, coluna in MEDIAS_EXECUCAO.items()
+        }, index=empresas)
+    
+    return padronizados, execucao
+
+def grafico_radar_notas(dados, empresa_sel, unidade_sel, competencia_sel, agrupamento_opcao):
+    """Gráfico radar com valores padronizados - SEST vs SENAT"""
     
-    # Mapas de período/sufixo
-    mapeamento_filtro = {
-        "Mês": "competencia",
-        "Trimestre": "trimestre",
-        "Semestre": "ano_semestre",
-        "Ano": "ano",
-    }
-    mapeamento_sufixo = {
-        "Mês": "_mensal",
-        "Trimestre": "_trimestral",
-        "Semestre": "_semestral",
-        "Ano": "_anual",
-    }
     
-    filtro_col = mapeamento_filtro[agrupamento_opcao]
-    sufixo = mapeamento_sufixo[agrupamento_opcao]
     
     # Cores por empresa
     cores_borda = {"SEST": "rgba(31,119,180,0.9)", "SENAT": "rgba(255,127,14,0.9)"}
     cores_fill  = {"SEST": "rgba(31,119,180,0.30)", "SENAT": "rgba(255,127,14,0.30)"}
     
     # Ordem dos eixos
-    indicadores = ["💸 Custo", "🥼 Produção", "💰 Equilíbrio Financeiro", "📊 Orçamento", "📈 Receita Operacional"]
-    empresas = ["SEST", "SENAT"]
+    indicadores = [rotulo for _, rotulo, _ in INDICADORES_RADAR]
+    
+    # SEST e SENAT calculados juntos (mesmo resultado usado pelos cards)
+    padronizados, _ = calcular_radar(dados, unidade_sel, competencia_sel, agrupamento_opcao)
     
     fig = go.Figure()
     traces_adicionados = 0
     
-    for empresa in empresas:
-        dfe = df[(df["empresa"] == empresa) & (df[filtro_col] == competencia_sel)]
-        if unidade_sel != "Todas":
-            dfe = dfe[dfe["unidade"] == unidade_sel]
-        
-        if dfe.empty:
-            continue
-        
-        # Obtém valores padronizados (0–1) mantendo a ordem dos indicadores
-        valores = obter_valores_padronizados(dfe, sufixo)
+    for empresa in padronizados.index:
+        # Valores padronizados (0–1) na ordem dos indicadores
+        valores = padronizados.loc[empresa].tolist()
         # Fecha o polígono sem mutar listas originais
         r_vals = valores + [valores[0]]
         th_vals = indicadores + [indicadores[0]]
@@ -103,33 +190,12 @@ def grafico_radar_notas(df, empresa_sel, unidade_sel, competencia_sel, agrupamen
     )
     return fig
 
-def exibir_cards_radar(df, empresa_sel, unidade_sel, competencia_sel, agrupamento_opcao):
+def exibir_cards_radar(dados, empresa_sel, unidade_sel, competencia_sel, agrupamento_opcao):
     """Cards com valores padronizados - SEST vs SENAT"""
     
    
-    # Mapeamento
-    coluna_periodo = {
-        "Mês": "competencia",
-        "Trimestre": "trimestre",
-        "Semestre": "ano_semestre",
-        "Ano": "ano"
-    }[agrupamento_opcao]
-    
-    sufixo = {
-        "Mês": "_mensal",
-        "Trimestre": "_trimestral", 
-        "Semestre": "_semestral",
-        "Ano": "_anual"
-    }[agrupamento_opcao]
-    
     # Configuração dos indicadores
-    indicadores_config = [
-        ("custo", "💸 Custo", "custo"),
-        ("producao", "🥼 Produção", "producao"),        
-        ("caixa", "💰 Equilíbrio Financeiro", "caixa"),                
-        ("orcamento", "📊 Orçamento", "orcamento"),
-        ("receita_operacional", "📈 Receita Operacional", "receita")
-    ]
+    indicadores_config = INDICADORES_RADAR
     
     # Título
     st.markdown("<div style='margin-top: 30px;'></div>", unsafe_allow_html=True)
@@ -152,51 +218,18 @@ def exibir_cards_radar(df, empresa_sel, unidade_sel, competencia_sel, agrupament
         unsafe_allow_html=True
     )
     
-    # Processar dados para ambas as empresas
-    empresas = ['SEST', 'SENAT']
-    dados_empresas = {}
+    # SEST e SENAT calculados juntos (mesmo resultado usado pelo gráfico)
+    padronizados, execucao = calcular_radar(dados, unidade_sel, competencia_sel, agrupamento_opcao)
     
-    for empresa in empresas:
-        # Filtrar dados para esta empresa
-        df_filtrado = df[df["empresa"] == empresa]
-        
-        if unidade_sel != "Todas":
-            df_filtrado = df_filtrado[df_filtrado["unidade"] == unidade_sel]
-        
-        df_filtrado = df_filtrado[df_filtrado[coluna_periodo] == competencia_sel]
-        
-        if not df_filtrado.empty:
-            # Calcular valores agregados por período
-            valores_agregados = calcular_valores_periodo(df_filtrado)
-            
-            # Pegar valores padronizados
-            if len(df_filtrado) == 1:
-                row = df_filtrado.iloc[0]
-            else:
-                # Para múltiplas linhas, fazer média dos valores padronizados
-                colunas_padronizadas = [
-                    f"nota_custo{sufixo}_padronizada",
-                    f"nota_producao{sufixo}_padronizada",                    
-                    f"nota_caixa{sufixo}_padronizada", 
-                    f"nota_orcamento{sufixo}_padronizada",
-                    f"nota_receita_operacional{sufixo}_padronizada"
-                ]
-                colunas_existentes = [col for col in colunas_padronizadas if col in df_filtrado.columns]
-                if colunas_existentes:
-                    row = df_filtrado[colunas_existentes].mean()
-                else:
-                    row = df_filtrado.iloc[0]  # fallback
-            
-            dados_empresas[empresa] = {
-                'row': row,
-                'valores_agregados': valores_agregados
-            }
-        else:
-            # Dados vazios se não encontrar
-            dados_empresas[empresa] = {
-                'row': pd.Series(),
-                'valores_agregados': {key: 0 for key in ["custo", "orcamento", "caixa", "producao", "receita_operacional"]}
-            }
+    def valores_card(empresa, nome_base, chave_agregado):
+        """(normalizado, executado) do card; 0 para empresa sem dados"""
+        if empresa not in padronizados.index:
+            return 0, 0
+        return padronizados.at[empresa, nome_base], execucao.at[empresa, chave_agregado]
+    
+    def texto_executado(valor):
+        """% executado do card; N/A quando o indicador não tem valores no período"""
+        return NOTA_NA_HTML if pd.isna(valor) else f"{valor:.2f}%"
     
     # Exibir cards para cada indicador
     for nome_base, nome_display, chave_agregado in indicadores_config:
@@ -206,16 +239,7 @@ def exibir_cards_radar(df, empresa_sel, unidade_sel, competencia_sel, agrupament
         
         # Card SEST (azul)
         with col1:
-            if 'SEST' in dados_empresas:
-                dados_sest = dados_empresas['SEST']
-                col_padronizada = f"nota_{nome_base}{sufixo}_padronizada"
-                valor_padronizado = dados_sest['row'].get(col_padronizada, 0)
-                if pd.isna(valor_padronizado):
-                    valor_padronizado = 0
-                valor_agregado = dados_sest['valores_agregados'].get(chave_agregado, 0)
-            else:
-                valor_padronizado = 0
-                valor_agregado = 0
+            valor_padronizado, valor_agregado = valores_card("SEST", nome_base, chave_agregado)
             
             st.markdown(f"""
                 <div style="
@@ -235,23 +259,14 @@ def exibir_cards_radar(df, empresa_sel, unidade_sel, competencia_sel, agrupament
                     </div>
                     <div style="font-size: 15px; font-weight: bold;">
                         Normalizado: {valor_padronizado:.2f} <br>
-                        Executado: {valor_agregado:.2f}%
+                        Executado: {texto_executado(valor_agregado)}
                     </div>
                 </div>
             """, unsafe_allow_html=True)
         
         # Card SENAT (laranja)
         with col2:
-            if 'SENAT' in dados_empresas:
-                dados_senat = dados_empresas['SENAT']
-                col_padronizada = f"nota_{nome_base}{sufixo}_padronizada"
-                valor_padronizado = dados_senat['row'].get(col_padronizada, 0)
-                if pd.isna(valor_padronizado):
-                    valor_padronizado = 0
-                valor_agregado = dados_senat['valores_agregados'].get(chave_agregado, 0)
-            else:
-                valor_padronizado = 0
-                valor_agregado = 0
+            valor_padronizado, valor_agregado = valores_card("SENAT", nome_base, chave_agregado)
             
             st.markdown(f"""
                 <div style="
@@ -271,11 +286,125 @@ def exibir_cards_radar(df, empresa_sel, unidade_sel, competencia_sel, agrupament
                     </div>
                     <div style="font-size: 15px; font-weight: bold;">
                         Normalizado: {valor_padronizado:.2f} <br>
-                        Executado: {valor_agregado:.2f}%
+                        Executado: {texto_executado(valor_agregado)}
                     </div>
                 </div>
             """, unsafe_allow_html=True)
 
+# ===== VÁRIAS UNIDADES =====
+def matriz_radar(cubo, empresa, unidades, competencia_sel, agrupamento_opcao):
+    """
+    Matriz (unidades × indicadores do radar) padronizada do período
+
+    Lida do cubo da Matriz Desempenho (cubo_fourbox.CuboFourbox, em cache por versão dos
+    dados) com um único gather, em vez de uma fatia e uma média por unidade. Notas
+    nulas contam como 0, como em calcular_radar.
+    """
+    coluna_periodo = COLUNA_PERIODO_RADAR[agrupamento_opcao]
+    colunas = [
+        f"nota_{base}{SUFIXO_RADAR[agrupamento_opcao]}_padronizada" for base, _, _ in INDICADORES_RADAR
+    ]
+    return np.nan_to_num(cubo.matriz_unidades(empresa, coluna_periodo, competencia_sel, unidades, colunas))
+
+def grafico_radar_unidades(cubo, empresa, unidades, competencia_sel, agrupamento_opcao, unidade_destaque=None):
+    """Perfis de várias unidades sobrepostos em um radar (traços WebGL), com destaque opcional"""
+    matriz = matriz_radar(cubo, empresa, unidades, competencia_sel, agrupamento_opcao)
+    indicadores = [rotulo for _, rotulo, _ in INDICADORES_RADAR]
+    th_vals = indicadores + [indicadores[0]]
+    paleta = px.colors.qualitative.Plotly
+    
+    tracos = []
+    for i, (unidade, valores) in enumerate(zip(unidades, matriz.tolist())):
+        destaque = unidade == unidade_destaque
+        tracos.append(go.Scatterpolargl(
+            r=valores + [valores[0]],
+            theta=th_vals,
+            name=unidade,
+            mode="lines",
+            fill="toself" if destaque else "none",
+            opacity=1.0 if destaque else 0.6,
+            line=dict(color="black" if destaque else paleta[i % len(paleta)], width=3 if destaque else 1),
+            hovertemplate="<b>%{theta}</b><br>Valor: %{r:.2f}<extra>" + unidade + "</extra>"
+        ))
+    
+    layout = go.Layout(
+        polar=dict(
+            gridshape="linear",
+            radialaxis=dict(visible=True, range=[0, 1], tickfont=dict(size=12), tickformat=".2f"),
+            angularaxis=dict(tickfont=dict(size=18), rotation=90, direction='clockwise'),
+        ),
+        height=935,
+        margin=dict(l=60, r=60, t=80, b=60),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        showlegend=True,
+        legend=dict(font=dict(size=10), bgcolor="rgba(255,255,255,0.6)")
+    )
+    return go.Figure(data=tracos, layout=layout)
+
+@lru_cache(maxsize=8)
+def grade_polar(linhas, colunas):
+    """Domínios (x, y) das células de uma grade de radares, montada uma vez com make_subplots"""
+    fig = make_subplots(
+        rows=linhas, cols=colunas,
+        specs=[[{"type": "polar"}] * colunas for _ in range(linhas)],
+        horizontal_spacing=0.06, vertical_spacing=0.25 / linhas
+    )
+    return tuple(
+        (tuple(polar.domain.x), tuple(polar.domain.y))
+        for polar in (fig.layout[f"polar{k + 1 if k else ''}"] for k in range(linhas * colunas))
+    )
+
+def grafico_radar_mosaico(cubo, empresa, unidades, competencia_sel, agrupamento_opcao,
+                          colunas=RADAR_MOSAICO_COLUNAS):
+    """Um pequeno radar por unidade (até RADAR_MOSAICO_MAX), todos na mesma escala 0–1"""
+    unidades = list(unidades)[:RADAR_MOSAICO_MAX]
+    matriz = matriz_radar(cubo, empresa, unidades, competencia_sel, agrupamento_opcao)
+    indicadores = [rotulo.split(" ", 1)[1] for _, rotulo, _ in INDICADORES_RADAR]
+    th_vals = indicadores + [indicadores[0]]
+    cor_borda = "rgba(31,119,180,0.9)" if empresa == "SEST" else "rgba(255,127,14,0.9)"
+    cor_fill = "rgba(31,119,180,0.30)" if empresa == "SEST" else "rgba(255,127,14,0.30)"
+    
+    linhas = max(1, -(-len(unidades) // colunas))
+    dominios = grade_polar(linhas, colunas)
+    
+    tracos, eixos, titulos = [], {}, []
+    for k, (unidade, valores) in enumerate(zip(unidades, matriz.tolist())):
+        polar = f"polar{k + 1 if k else ''}"
+        (x0, x1), (y0, y1) = dominios[k]
+        tracos.append(go.Scatterpolargl(
+            r=valores + [valores[0]],
+            theta=th_vals,
+            subplot=polar,
+            name=unidade,
+            mode="lines",
+            fill="toself",
+            line=dict(color=cor_borda, width=2),
+            fillcolor=cor_fill,
+            showlegend=False,
+            hovertemplate="<b>%{theta}</b><br>Valor: %{r:.2f}<extra>" + unidade + "</extra>"
+        ))
+        eixos[polar] = dict(
+            domain=dict(x=[x0, x1], y=[y0, y1]),
+            gridshape="linear",
+            radialaxis=dict(range=[0, 1], showticklabels=False),
+            angularaxis=dict(tickfont=dict(size=9), rotation=90, direction='clockwise'),
+        )
+        titulos.append(dict(
+            text=unidade, x=(x0 + x1) / 2, y=y1, xref="paper", yref="paper",
+            xanchor="center", yanchor="bottom", yshift=18, showarrow=False, font_size=11
+        ))
+    
+    layout = go.Layout(
+        **eixos,
+        annotations=titulos,
+        height=ALTURA_CELULA_MOSAICO * linhas,
+        margin=dict(l=40, r=40, t=60, b=20),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+    )
+    return go.Figure(data=tracos, layout=layout)
+
 def obter_valores_originais(df_filtrado):
     """
     Obtém valores originais (não padronizados) de forma segura
@@ -331,90 +460,6 @@ def obter_valores_originais(df_filtrado):
     
     return valores
 
-def obter_valores_padronizados(df_filtrado, sufixo):
-    """
-    Obtém valores padronizados de forma segura
-    
-    Args:
-        df_filtrado: DataFrame já filtrado
-        sufixo: Sufixo do período (_mensal, _trimestral, etc.)
-    
-    Returns:
-        list: Lista com valores padronizados na ordem [custo, produção, nps, caixa, orçamento, receita]
-    """
-    # Definir colunas padronizadas na ordem correta
-    colunas_ordem = [
-        f"nota_custo{sufixo}_padronizada",
-        f"nota_producao{sufixo}_padronizada",        
-        f"nota_caixa{sufixo}_padronizada",
-        f"nota_orcamento{sufixo}_padronizada",
-        f"nota_receita_operacional{sufixo}_padronizada"
-    ]
-    
-    # Verificar quais colunas existem
-    colunas_existentes = [col for col in colunas_ordem if col in df_filtrado.columns]
-    
-    if not colunas_existentes:
-        return [0, 0, 0, 0, 0, 0]
-    
-    # Obter valores (média se múltiplas linhas)
-    if len(df_filtrado) == 1:
-        row = df_filtrado.iloc[0]
-    else:
-        row = df_filtrado[colunas_existentes].mean()
-    
-    # Extrair valores na ordem correta, usando 0 para colunas não encontradas
-    valores = []
-    for col in colunas_ordem:
-        if col in df_filtrado.columns:
-            valor = row.get(col, 0)
-            # Garantir que não é NaN
-            if pd.isna(valor):
-                valor = 0
-            valores.append(float(valor))
-        else:
-            valores.append(0.0)
-    
-    return valores
-
-def calcular_valores_periodo(df_filtrado):
-    """Calcula valores agregados por período usando as colunas do DataFrame"""
-    
-    # Somar valores para o período (agregado)
-    soma_custo_realizado = df_filtrado["soma_custo_realizado"].sum()
-    soma_meta = df_filtrado["soma_meta"].sum()
-    
-    despesa_liquidada = df_filtrado["despesa_liquidada"].sum()
-    despesa_prevista = df_filtrado["despesa_prevista"].sum()
-    
-    receitas = df_filtrado["receitas"].sum()
-    despesas = df_filtrado["despesas"].sum()
-    
-    receita_prevista = df_filtrado["receita_prevista"].sum()
-    receita_realizada = df_filtrado["receita_realizada"].sum()
-    
-    # Produção (média ponderada ou soma)
-    nota_producao = df_filtrado["nota_producao"].mean() * 100
-    nota_nps = df_filtrado["nota_nps"].mean() * 100
-    
-    # Calcular indicadores
-    custo = (soma_custo_realizado / soma_meta * 100) if soma_meta > 0 else 0
-    orcamento = (despesa_liquidada / despesa_prevista * 100) if despesa_prevista > 0 else 0
-    caixa = (receitas / despesas * 100) if despesas > 0 else 0
-    producao = nota_producao
-    nps = nota_nps
-    receita = (receita_realizada / receita_prevista * 100) if receita_prevista > 0 else 0
-    
-    
-    return {
-        "custo": custo,
-        "orcamento": orcamento, 
-        "caixa": caixa,
-        "nps": nps,
-        "producao": producao,
-        "receita": receita
-    }
-
 def debug_colunas_disponiveis(df):
     """Mostra colunas disponíveis para debug"""
     colunas_relevantes = [
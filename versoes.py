@@ -0,0 +1,84 @@
+"""
+Registro de versões do dataset de indicadores.
+
+Cada versão é um parquet registrado com o hash do conteúdo e um resumo do esquema
+(linhas, tipos, competências e abas com colunas ausentes) em _versoes_dados.json.
+A versão ativa tem precedência sobre o dataset particionado e os arquivos padrão;
+trocá-la não exige reiniciar a aplicação: os caches são chaveados pela versão
+(dados.versao_dados) e cada sessão passa a ler a nova versão no próximo rerun.
+
+Uso:
+    python versoes.py registrar arquivo.parquet [...] [--nome NOME] [--ativar]
+    python versoes.py ativar NOME
+    python versoes.py desativar
+    python versoes.py precarregar NOME
+    python versoes.py listar
+"""
+import argparse
+
+from dados import ativar_versao, ler_registro, precarregar_versao, registrar_versao
+
+
+# ===== COMANDOS =====
+def registrar(arquivos, nome=None, ativar=False):
+    """Registra os arquivos (nome só vale para um arquivo) e, opcionalmente, ativa o último"""
+    if nome and len(arquivos) > 1:
+        raise ValueError("--nome só pode ser usado com um único arquivo")
+    entradas = [registrar_versao(arquivo, nome) for arquivo in arquivos]
+    if ativar:
+        ativar_versao(entradas[-1]["nome"])
+    return entradas
+
+def listar():
+    registro = ler_registro()
+    ativa = registro["ativa"]
+    print(f"{len(registro['versoes'])} versões | ativa: {ativa or '(fontes padrão)'}")
+    for nome, entrada in sorted(registro["versoes"].items()):
+        marcador = "*" if nome == ativa else " "
+        competencias = " a ".join(entrada["competencias"]) or "sem competências"
+        print(f"{marcador} {nome}: {entrada['arquivo']} | {entrada['linhas']} linhas x"
+              f" {len(entrada['tipos'])} colunas | {competencias} | {entrada['hash'][:12]}")
+        for aba, colunas in entrada["abas_incompletas"].items():
+            print(f"    ⚠️ {aba}: {len(colunas)} coluna(s) ausente(s) (ex.: {colunas[0]})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registro de versões do dataset")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_registrar = subparsers.add_parser("registrar", help="registra parquets como versões")
+    p_registrar.add_argument("arquivos", nargs="+")
+    p_registrar.add_argument("--nome", help="nome da versão (padrão: nome do arquivo)")
+    p_registrar.add_argument("--ativar", action="store_true", help="ativa a versão registrada")
+
+    p_ativar = subparsers.add_parser("ativar", help="troca a versão em uso pela aplicação")
+    p_ativar.add_argument("nome")
+
+    subparsers.add_parser("desativar", help="volta às fontes padrão (particionado/preparado)")
+
+    p_precarregar = subparsers.add_parser(
+        "precarregar", help="grava o arquivo compartilhado da versão (PAINEL_DADOS_COMPARTILHADOS=1)"
+    )
+    p_precarregar.add_argument("nome")
+
+    subparsers.add_parser("listar", help="lista as versões registradas")
+    args = parser.parse_args()
+
+    try:
+        if args.comando == "registrar":
+            for entrada in registrar(args.arquivos, args.nome, args.ativar):
+                print(f"✅ {entrada['nome']} registrada ({entrada['linhas']} linhas, {entrada['hash'][:12]})")
+            if args.ativar:
+                print(f"   versão ativa: {entrada['nome']}")
+        elif args.comando == "ativar":
+            ativar_versao(args.nome)
+            print(f"✅ Versão ativa: {args.nome}")
+        elif args.comando == "desativar":
+            ativar_versao(None)
+            print("✅ Registro desativado: aplicação volta às fontes padrão")
+        elif args.comando == "precarregar":
+            print(f"✅ {args.nome} pré-carregada em {precarregar_versao(args.nome)}")
+        else:
+            listar()
+    except ValueError as erro:
+        parser.exit(1, f"❌ {erro}\n")